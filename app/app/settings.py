@@ -53,12 +53,84 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = 'app.asgi.application'
 
+# Shared state for running several server processes. Without Redis the
+# caches and the channel layer are in-process, which only works with a
+# single server process (scripts/run.sh single mode)
+REDIS_URL = os.environ.get('REDIS_URL')
+FEED_CACHE_URL = os.environ.get('FEED_CACHE_URL', REDIS_URL)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Feed invalidation bumps version keys that every process must see,
+    # so the feed is only cached when a shared cache is configured
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+}
+
+if FEED_CACHE_URL:
+    CACHES['feed'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': FEED_CACHE_URL,
+        'KEY_PREFIX': 'feed',
+        'TIMEOUT': int(os.environ.get('FEED_CACHE_TIMEOUT', 300)),
+    }
+
+if REDIS_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+
+# Chat presence, kept in the default cache
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', 90))
+PRESENCE_HEARTBEAT_INTERVAL = int(
+    os.environ.get('PRESENCE_HEARTBEAT_INTERVAL', 30))
+PRESENCE_DEBOUNCE_SECONDS = float(
+    os.environ.get('PRESENCE_DEBOUNCE_SECONDS', 2))
+
+# Typing indicators and read receipts
+TYPING_THROTTLE_SECONDS = float(
+    os.environ.get('TYPING_THROTTLE_SECONDS', 3))
+READ_MARKER_FLUSH_SECONDS = float(
+    os.environ.get('READ_MARKER_FLUSH_SECONDS', 5))
+
+# Chat socket limits
+CHAT_MAX_FRAME_BYTES = int(os.environ.get('CHAT_MAX_FRAME_BYTES', 8192))
+CHAT_RATE_PER_SECOND = float(os.environ.get('CHAT_RATE_PER_SECOND', 5))
+CHAT_RATE_BURST = int(os.environ.get('CHAT_RATE_BURST', 10))
+CHAT_GROUP_RATE_PER_SECOND = float(
+    os.environ.get('CHAT_GROUP_RATE_PER_SECOND', 50))
+CHAT_GROUP_RATE_BURST = int(os.environ.get('CHAT_GROUP_RATE_BURST', 100))
+CHAT_SEND_QUEUE_SIZE = int(os.environ.get('CHAT_SEND_QUEUE_SIZE', 100))
+# Months of chat history kept in the Message table, see archive_messages
+CHAT_ARCHIVE_AFTER_MONTHS = int(
+    os.environ.get('CHAT_ARCHIVE_AFTER_MONTHS', 6))
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels.layers.InMemoryChannelLayer'
     }
 }
 
+# Redis servers of the chat channel layer, comma separated. Every group
+# and socket channel is consistent-hashed onto one of them, so the rooms
+# and their fan-out are spread over all hosts. Every process must use the
+# same list, in the same order
+CHAT_REDIS_HOSTS = [
+    host for host in os.environ.get('CHAT_REDIS_HOSTS', '').split(',')
+    if host
+] or ([REDIS_URL] if REDIS_URL else [])
+
+if CHAT_REDIS_HOSTS:
+    # Chat broadcasts reach sockets held by other processes
+    CHANNEL_LAYERS['default'] = {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {'hosts': CHAT_REDIS_HOSTS},
+    }
+
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
@@ -66,6 +138,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db_routing.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -95,6 +168,39 @@ AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
 AWS_REGION_NAME = os.environ.get('AWS_REGION_NAME', 'eu-central-1')
 AWS_SNS_PLATFORM_APPLICATION_ARN = os.environ.get('AWS_SNS_PLATFORM_APPLICATION_ARN')
 AWS_SNS_TOPIC_MAIN_ARN = os.environ.get('AWS_SNS_TOPIC_MAIN_ARN')
+# 'boto3' talks to AWS, 'fake' keeps every call in-process
+AWS_SNS_BACKEND = os.environ.get('AWS_SNS_BACKEND', 'boto3')
+AWS_SNS_FAKE_LATENCY = float(os.environ.get('AWS_SNS_FAKE_LATENCY', 0))
+AWS_SNS_MAX_POOL_CONNECTIONS = int(
+    os.environ.get('AWS_SNS_MAX_POOL_CONNECTIONS', 32))
+AWS_SNS_TCP_KEEPALIVE = bool(int(os.environ.get('AWS_SNS_TCP_KEEPALIVE', 1)))
+
+PUSH_OUTBOX_BATCH_SIZE = int(os.environ.get('PUSH_OUTBOX_BATCH_SIZE', 100))
+PUSH_OUTBOX_CONCURRENCY = int(os.environ.get('PUSH_OUTBOX_CONCURRENCY', 8))
+PUSH_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('PUSH_OUTBOX_MAX_ATTEMPTS', 5))
+PUSH_OUTBOX_BACKOFF_SECONDS = int(
+    os.environ.get('PUSH_OUTBOX_BACKOFF_SECONDS', 30))
+# Sent and failed entries are deleted this many days after their last attempt
+PUSH_OUTBOX_RETENTION_DAYS = int(
+    os.environ.get('PUSH_OUTBOX_RETENTION_DAYS', 7))
+PUSH_OUTBOX_PURGE_BATCH_SIZE = int(
+    os.environ.get('PUSH_OUTBOX_PURGE_BATCH_SIZE', 1000))
+
+# Must stay below core.push.CLAIM_LEASE
+NOTIFICATION_COALESCE_SECONDS = int(
+    os.environ.get('NOTIFICATION_COALESCE_SECONDS', 60))
+NOTIFICATION_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BATCH_SIZE', 500))
+# Skip chat pushes to users with an open chat socket. Presence is read by
+# the push worker, so this needs the shared Redis cache
+NOTIFICATION_SKIP_ONLINE = bool(int(os.environ.get(
+    'NOTIFICATION_SKIP_ONLINE', int(bool(REDIS_URL)))))
+
+ACCOUNT_DELETION_BATCH_SIZE = int(
+    os.environ.get('ACCOUNT_DELETION_BATCH_SIZE', 500))
+ACCOUNT_DELETION_FILE_CONCURRENCY = int(
+    os.environ.get('ACCOUNT_DELETION_FILE_CONCURRENCY', 8))
+ACCOUNT_DELETION_BACKOFF_SECONDS = int(
+    os.environ.get('ACCOUNT_DELETION_BACKOFF_SECONDS', 60))
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -103,12 +209,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        # Every server runs ASGI, where each request gets a new thread
+        # and so a new connection, and persistent connections are never
+        # reused. Connections are pooled by PgBouncer instead, see
+        # docker-compose-deploy.yaml
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))),
+        # Required behind a transaction pooling PgBouncer
+        'DISABLE_SERVER_SIDE_CURSORS': bool(
+            int(os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 0))),
     }
 }
 
+# Read replicas, used by views with core.db_routing.ReplicaReadMixin
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['core.db_routing.ReplicaRouter']
+# Seconds a user's reads stay on the primary after they wrote
+DB_REPLICA_STICKY_SECONDS = int(
+    os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -0,0 +1,242 @@
+"""
+Asynchronous deletion of user accounts through the AccountDeletion table.
+
+The request only revokes access and queues a job. The worker then
+removes the user's rows table by table in small batches, each in its
+own short transaction, so no request holds locks for the whole cascade
+and no batch loads more than `ACCOUNT_DELETION_BATCH_SIZE` rows. Stored
+images are removed once their rows are gone.
+"""
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.models import (
+    AccountDeletion,
+    Comment,
+    Device,
+    Group,
+    Message,
+    NotificationEvent,
+    PushOutbox,
+    ReadMarker,
+    User,
+    Workout,
+)
+
+# How long a running job may go without progress before another worker
+# takes it over
+CLAIM_LEASE = timedelta(minutes=5)
+MAX_ATTEMPTS = 5
+
+Like = Workout.liked_by.through
+Membership = Group.members.through
+
+
+def request_deletion(user):
+    """Revoke a user's access and queue the deletion of their data.
+
+    The email address is released right away so it can be registered
+    again while the job is still running."""
+    with transaction.atomic():
+        Token.objects.filter(user=user).delete()
+        user.is_active = False
+        user.email = f'deleted-{user.id}@invalid'
+        user.name = ''
+        user.set_unusable_password()
+        user.save(update_fields=['is_active', 'email', 'name', 'password'])
+        return AccountDeletion.objects.create(user=user)
+
+
+def _delete_batch(queryset, batch_size, counter=None, file_field=None):
+    """Delete up to `batch_size` rows of `queryset`.
+
+    `counter` names the Workout column counting the rows, which is
+    decremented for the workouts they belonged to. Returns the number
+    of rows deleted and the names of the files they referenced."""
+    fields = ['pk']
+    if counter:
+        fields.append('workout_id')
+    if file_field:
+        fields.append(file_field)
+    rows = list(queryset.values_list(*fields)[:batch_size])
+    if not rows:
+        return 0, []
+
+    counts = Counter(row[1] for row in rows) if counter else {}
+    with transaction.atomic():
+        queryset.model.objects.filter(
+            pk__in=[row[0] for row in rows]).delete()
+        for workout_id, count in counts.items():
+            Workout.objects.filter(pk=workout_id).update(
+                **{counter: Greatest(F(counter) - count, 0)})
+    files = [row[-1] for row in rows if file_field and row[-1]]
+    return len(rows), files
+
+
+def _leave_groups_batch(queryset, batch_size):
+    """Remove a batch of memberships and delete groups left empty."""
+    rows = list(queryset.values_list('pk', 'group_id')[:batch_size])
+    if not rows:
+        return 0, []
+
+    group_ids = {group_id for _, group_id in rows}
+    with transaction.atomic():
+        # Same lock as leaving a group, so exactly one of the last
+        # members sees it empty
+        list(Group.objects.select_for_update().filter(pk__in=group_ids))
+        Membership.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        Group.objects.filter(pk__in=group_ids, members=None).delete()
+    return len(rows), []
+
+
+def _anonymize_batch(queryset, batch_size):
+    """Detach a batch of chat messages from their sender."""
+    ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+    if ids:
+        Message.objects.filter(pk__in=ids).update(sender=None)
+    return len(ids), []
+
+
+def _steps(user_id):
+    """Return the (name, queryset, handler, options) steps deleting a
+    user's data, dependent rows first."""
+    own_workouts = Q(workout__user_id=user_id)
+    return [
+        ('devices', Device.objects.filter(user_id=user_id),
+         _delete_batch, {}),
+        ('push_outbox', PushOutbox.objects.filter(user_id=user_id),
+         _delete_batch, {}),
+        ('read_markers', ReadMarker.objects.filter(user_id=user_id),
+         _delete_batch, {}),
+        ('notifications', NotificationEvent.objects.filter(
+            Q(actor_id=user_id) | own_workouts), _delete_batch, {}),
+        ('likes', Like.objects.filter(user_id=user_id).exclude(own_workouts),
+         _delete_batch, {'counter': 'fires'}),
+        ('comments', Comment.objects.filter(author_id=user_id)
+         .exclude(own_workouts), _delete_batch,
+         {'counter': 'comments_count'}),
+        ('workout_likes', Like.objects.filter(own_workouts),
+         _delete_batch, {}),
+        ('workout_comments', Comment.objects.filter(own_workouts),
+         _delete_batch, {}),
+        ('workouts', Workout.objects.filter(user_id=user_id),
+         _delete_batch, {'file_field': 'image'}),
+        ('groups', Membership.objects.filter(user_id=user_id),
+         _leave_groups_batch, {}),
+        ('messages', Message.objects.filter(sender_id=user_id),
+         _anonymize_batch, {}),
+    ]
+
+
+def _delete_files(storage, names):
+    """Delete stored files concurrently, returning how many were
+    removed."""
+    def delete(name):
+        try:
+            storage.delete(name)
+        except OSError:
+            return False
+        return True
+
+    if not names:
+        return 0
+    with ThreadPoolExecutor(
+            max_workers=settings.ACCOUNT_DELETION_FILE_CONCURRENCY
+    ) as executor:
+        return sum(executor.map(delete, names))
+
+
+def _claim():
+    """Lock and take the oldest due job for this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (AccountDeletion.objects
+               .select_for_update(skip_locked=True)
+               .filter(Q(status=AccountDeletion.STATUS_PENDING,
+                         next_attempt_at__lte=now)
+                       | Q(status=AccountDeletion.STATUS_RUNNING,
+                           updated_at__lt=now - CLAIM_LEASE))
+               .order_by('created_at')
+               .first())
+        if job is not None:
+            job.status = AccountDeletion.STATUS_RUNNING
+            job.attempts += 1
+            job.save(update_fields=['status', 'attempts', 'updated_at'])
+    return job
+
+
+def _run(job, batch_size):
+    """Delete everything left of the job's user, saving progress after
+    every batch. Each step is idempotent, so an interrupted job simply
+    runs again."""
+    user_id = job.user_id
+    if user_id is not None:
+        steps = _steps(user_id)
+        if job.total_rows is None:
+            # The user row itself is the last one
+            job.total_rows = sum(queryset.count()
+                                 for _, queryset, _, _ in steps) + 1
+            job.save(update_fields=['total_rows', 'updated_at'])
+
+        image_storage = Workout._meta.get_field('image').storage
+        for step, queryset, handler, options in steps:
+            job.step = step
+            while True:
+                rows, files = handler(queryset, batch_size, **options)
+                if not rows:
+                    break
+                job.deleted_rows += rows
+                job.deleted_files += _delete_files(image_storage, files)
+                job.save(update_fields=['step', 'deleted_rows',
+                                        'deleted_files', 'updated_at'])
+
+        job.step = 'user'
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            picture = user.profile_picture
+            user.delete()
+            job.deleted_rows += 1
+            if picture:
+                job.deleted_files += _delete_files(
+                    picture.storage, [picture.name])
+
+    job.status = AccountDeletion.STATUS_DONE
+    job.step = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'step', 'deleted_rows',
+                            'deleted_files', 'finished_at', 'updated_at'])
+
+
+def _backoff(attempts):
+    return timedelta(seconds=settings.ACCOUNT_DELETION_BACKOFF_SECONDS
+                     * 2 ** (attempts - 1))
+
+
+def process_next(batch_size=None):
+    """Run the oldest due deletion job to completion.
+
+    Returns the job, or None if no job was due."""
+    job = _claim()
+    if job is None:
+        return None
+
+    try:
+        _run(job, batch_size or settings.ACCOUNT_DELETION_BATCH_SIZE)
+    except Exception as e:
+        job.last_error = str(e) or e.__class__.__name__
+        if job.attempts >= MAX_ATTEMPTS:
+            job.status = AccountDeletion.STATUS_FAILED
+        else:
+            job.status = AccountDeletion.STATUS_PENDING
+            job.next_attempt_at = timezone.now() + _backoff(job.attempts)
+        job.save(update_fields=['status', 'next_attempt_at', 'last_error',
+                                'updated_at'])
+    return job
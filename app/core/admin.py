@@ -69,9 +69,34 @@ class CommentAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
 
 
+class DeviceAdmin(admin.ModelAdmin):
+    """Define the admin pages for push devices."""
+    list_display = ['device_token', 'user', 'enabled', 'updated_at']
+    search_fields = ['device_token', 'user__email']
+    list_filter = ['enabled']
+
+
+class MessageArchiveAdmin(admin.ModelAdmin):
+    """Define the admin pages for chat archives."""
+    list_display = ['group', 'month', 'message_count', 'created_at']
+    list_filter = ['month']
+
+
+class AccountDeletionAdmin(admin.ModelAdmin):
+    """Define the admin pages for account deletions."""
+    list_display = ['key', 'status', 'step', 'deleted_rows', 'total_rows',
+                    'attempts', 'next_attempt_at', 'created_at',
+                    'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['key']
+
+
 # Register models with the admin site
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Group, GroupAdmin)
 admin.site.register(models.Workout, WorkoutAdmin)
 admin.site.register(models.Message, MessageAdmin)
 admin.site.register(models.Comment, CommentAdmin)
+admin.site.register(models.Device, DeviceAdmin)
+admin.site.register(models.MessageArchive, MessageArchiveAdmin)
+admin.site.register(models.AccountDeletion, AccountDeletionAdmin)
@@ -0,0 +1,159 @@
+"""
+Archival of old chat history into compressed files.
+
+Messages older than CHAT_ARCHIVE_AFTER_MONTHS are written per (group,
+month) as gzipped JSON lines to the default storage, recorded as a
+MessageArchive and deleted from the Message table, which keeps the hot
+table and its indexes limited to recent history.
+"""
+import gzip
+import json
+import tempfile
+from collections.abc import Sequence
+from datetime import date, datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from core.models import Message, MessageArchive
+
+
+def add_months(month, months):
+    """Return the first day of the month `months` after `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def archive_cutoff(now=None, months=None):
+    """Start of the oldest month that stays in the Message table."""
+    now = timezone.localdate(now)
+    if months is None:
+        months = settings.CHAT_ARCHIVE_AFTER_MONTHS
+    return add_months(now.replace(day=1), -months)
+
+
+def _month_bounds(month):
+    end = add_months(month, 1)
+    return (
+        timezone.make_aware(datetime(month.year, month.month, 1)),
+        timezone.make_aware(datetime(end.year, end.month, 1)),
+    )
+
+
+def months_to_archive(cutoff):
+    """Yield (group_id, month) pairs with messages before `cutoff`."""
+    start, _ = _month_bounds(cutoff)
+    pairs = (Message.objects
+             .filter(timestamp__lt=start)
+             .annotate(month=TruncMonth('timestamp'))
+             .values_list('group_id', 'month')
+             .order_by('group_id', 'month')
+             .distinct())
+    for group_id, month in pairs:
+        yield group_id, timezone.localtime(month).date()
+
+
+def archive_month(group_id, month):
+    """Move the messages of a group sent in `month` into an archive.
+
+    Returns the archive, or None if there was nothing to move."""
+    start, end = _month_bounds(month)
+    messages = (Message.objects
+                .filter(group_id=group_id, timestamp__gte=start,
+                        timestamp__lt=end)
+                .order_by('seq')
+                .values_list('id', 'seq', 'sender_id', 'content',
+                             'timestamp'))
+
+    count, first_seq, last_seq = 0, None, None
+    with tempfile.TemporaryFile() as buffer:
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as archive:
+            for id, seq, sender_id, content, timestamp in \
+                    messages.iterator(chunk_size=2000):
+                archive.write(json.dumps({
+                    'id': id,
+                    'seq': seq,
+                    'sender_id': sender_id,
+                    'content': content,
+                    'timestamp': timestamp.isoformat(),
+                }).encode() + b'\n')
+                count += 1
+                first_seq = seq if first_seq is None else first_seq
+                last_seq = seq
+        if not count:
+            return None
+
+        buffer.seek(0)
+        archive = MessageArchive(
+            group_id=group_id, month=month, first_seq=first_seq,
+            last_seq=last_seq, message_count=count)
+        # Storage is not transactional: store the file first and remove
+        # it again if the row or the deletes are rolled back
+        archive.file.save(
+            f'{group_id}/{month:%Y-%m}-{first_seq}-{last_seq}.jsonl.gz',
+            File(buffer), save=False)
+        try:
+            with transaction.atomic():
+                archive.save()
+                Message.objects.filter(
+                    group_id=group_id, seq__range=(first_seq, last_seq),
+                    timestamp__gte=start, timestamp__lt=end).delete()
+        except Exception:
+            archive.file.delete(save=False)
+            raise
+    return archive
+
+
+def read_archive(archive, start=0, stop=None):
+    """Return the messages stored in an archive, oldest first.
+
+    `start` and `stop` select a range of messages; lines outside it
+    are skipped without being parsed."""
+    with archive.file.open('rb') as stored:
+        with gzip.GzipFile(fileobj=stored) as lines:
+            return [json.loads(line)
+                    for line in islice(lines, start, stop)]
+
+
+class ArchivedMessages(Sequence):
+    """The messages of several archives, newest first, for paginating.
+
+    Archives must be given newest first. Slicing only reads the
+    archives overlapping the slice and parses only its messages."""
+
+    def __init__(self, archives):
+        self.archives = list(archives)
+
+    def __len__(self):
+        return sum(archive.message_count for archive in self.archives)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            messages = self._range(start, stop)
+            return messages[::step] if step != 1 else messages
+        if index < 0:
+            index += len(self)
+        messages = self._range(index, index + 1) if index >= 0 else []
+        if not messages:
+            raise IndexError('archived message index out of range')
+        return messages[0]
+
+    def _range(self, start, stop):
+        messages, offset = [], 0
+        for archive in self.archives:
+            count = archive.message_count
+            if offset >= stop:
+                break
+            if offset + count > start:
+                # Position i from the newest is line count - 1 - i
+                first = max(start - offset, 0)
+                last = min(stop - offset, count)
+                messages.extend(reversed(
+                    read_archive(archive, count - last, count - first)))
+            offset += count
+        return messages
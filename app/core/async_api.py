@@ -0,0 +1,55 @@
+"""
+Async read endpoints served without DRF.
+
+DRF views are synchronous, so under ASGI every request runs in a worker
+thread. AsyncAPIView is a plain Django async view that authenticates
+DRF tokens with the async ORM and renders with DRF's JSON renderer, so
+its responses look like those of the DRF views. Only endpoints that
+measured faster than their DRF version (benchmark_async_views) use it.
+"""
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+
+def json_response(data, status=200, headers=None):
+    """Render `data` the way DRF's JSON renderer does."""
+    return HttpResponse(JSONRenderer().render(data), status=status,
+                        headers=headers, content_type='application/json')
+
+
+async def authenticate(request):
+    """Async equivalent of DRF's TokenAuthentication.
+
+    Returns the user and None, or None and the reason for refusing."""
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return None, 'Authentication credentials were not provided.'
+    if len(auth) != 2:
+        return None, 'Invalid token header.'
+
+    try:
+        token = await (Token.objects.select_related('user')
+                       .aget(key=auth[1].decode()))
+    except (Token.DoesNotExist, UnicodeError):
+        return None, 'Invalid token.'
+    if not token.user.is_active:
+        return None, 'User inactive or deleted.'
+    return token.user, None
+
+
+class AsyncAPIView(View):
+    """Async view for token-authenticated JSON reads.
+
+    Handlers must be coroutines; they find the authenticated user on
+    `request.user` and return `json_response`s."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        user, error = await authenticate(request)
+        if user is None:
+            return json_response({'detail': error}, status=401,
+                                 headers={'WWW-Authenticate': 'Token'})
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
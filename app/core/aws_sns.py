@@ -1,19 +1,80 @@
-import boto3
+import itertools
 import json
+import threading
+import time
 
 from django.conf import settings
 
-sns_client = boto3.client(
-    "sns",
-    region_name=settings.AWS_REGION_NAME,
-    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
-)
+
+class FakeSNSClient:
+    """In-process stand-in for the SNS client used for local runs
+    and offline benchmarks. Every call sleeps `latency` seconds to
+    simulate the AWS round-trip and is recorded in `calls`."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _call(self, operation, **params):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls.append((operation, params))
+            return next(self._ids)
+
+    def create_platform_endpoint(self, PlatformApplicationArn, Token):
+        call_id = self._call('create_platform_endpoint', Token=Token)
+        return {'EndpointArn': f'arn:fake:sns:endpoint/{call_id}'}
+
+    def subscribe(self, TopicArn, Protocol, Endpoint):
+        call_id = self._call('subscribe', Endpoint=Endpoint)
+        return {'SubscriptionArn': f'arn:fake:sns:subscription/{call_id}'}
+
+    def publish(self, TargetArn, MessageStructure, Message):
+        call_id = self._call('publish', TargetArn=TargetArn, Message=Message)
+        return {'MessageId': str(call_id)}
+
+
+def _create_client():
+    if settings.AWS_SNS_BACKEND == 'fake':
+        return FakeSNSClient(latency=settings.AWS_SNS_FAKE_LATENCY)
+
+    # boto3 is slow to import, only pay for it when SNS is used
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "sns",
+        region_name=settings.AWS_REGION_NAME,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        config=Config(
+            max_pool_connections=settings.AWS_SNS_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=settings.AWS_SNS_TCP_KEEPALIVE,
+        )
+    )
+
+
+# Built on first use by get_sns_client()
+sns_client = None
+_client_lock = threading.Lock()
+
+
+def get_sns_client():
+    """Return the shared SNS client, creating it on first use."""
+    global sns_client
+    if sns_client is None:
+        with _client_lock:
+            if sns_client is None:
+                sns_client = _create_client()
+    return sns_client
 
 
 def create_endpoint(device_token):
     platform_arn = settings.AWS_SNS_PLATFORM_APPLICATION_ARN
-    response = sns_client.create_platform_endpoint(
+    response = get_sns_client().create_platform_endpoint(
         PlatformApplicationArn=platform_arn,
         Token=device_token,
     )
@@ -22,7 +83,7 @@ def create_endpoint(device_token):
 
 def subscribe_user_to_topic(endpoint_arn):
     topic_arn = settings.AWS_SNS_TOPIC_MAIN_ARN
-    response = sns_client.subscribe(
+    response = get_sns_client().subscribe(
         TopicArn=topic_arn,
         Protocol="application",
         Endpoint=endpoint_arn
@@ -31,7 +92,7 @@ def subscribe_user_to_topic(endpoint_arn):
 
 
 def send_push_notification(endpoint_arn, message):
-    response = sns_client.publish(
+    response = get_sns_client().publish(
         TargetArn=endpoint_arn,
         MessageStructure='json',
         Message=json.dumps({
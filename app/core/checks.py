@@ -0,0 +1,27 @@
+"""
+System checks for settings that only work across processes with
+shared state.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_presence_cache(app_configs, **kwargs):
+    """Chat presence is written by the socket processes and read by the
+    push worker, so skipping online users needs a shared cache."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.NOTIFICATION_SKIP_ONLINE and backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            'NOTIFICATION_SKIP_ONLINE needs a default cache shared by '
+            'every process.',
+            hint='Set REDIS_URL, or disable NOTIFICATION_SKIP_ONLINE.',
+            obj=backend,
+            id='core.E001',
+        )]
+    return []
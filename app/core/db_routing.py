@@ -0,0 +1,160 @@
+"""
+Routing of read-only view queries to database replicas.
+
+Views opt in with ReplicaReadMixin. Their reads go to one of
+DATABASE_REPLICAS, picked once per request so all of them see the same
+replication state, unless the user wrote something within the last
+DB_REPLICA_STICKY_SECONDS, in which case they stay on the primary so
+users always see their own writes. Everything else, including all
+writes and chat consumers, uses `default`.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+
+class _RequestState:
+    """Routing state of the current request: the replica its reads use,
+    if any, and whether it wrote."""
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+# Holds a mutable state object so that flags set inside views run in
+# other threads are visible to the middleware
+_request_state = ContextVar('db_request_state', default=None)
+
+
+def _sticky_key(user_id):
+    return f'db-sticky:{user_id}'
+
+
+def mark_written(user_id):
+    """Pin a user's reads to the primary while replicas catch up."""
+    cache.set(_sticky_key(user_id), True,
+              timeout=settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user_id):
+    return cache.get(_sticky_key(user_id), False)
+
+
+@contextmanager
+def read_primary():
+    """Send the reads of the block to the primary, even in a view that
+    reads from a replica, e.g. to build data that outlives the request."""
+    state = _request_state.get()
+    replica = state.replica if state is not None else None
+    if replica:
+        state.replica = None
+    try:
+        yield
+    finally:
+        if replica:
+            state.replica = replica
+
+
+class ReplicaRouter:
+    """Send opted-in reads to a replica and everything else to the
+    primary."""
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is not None and state.replica and not state.wrote:
+            return state.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaStickinessMiddleware:
+    """Track writes of each request and make the writer sticky."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote and settings.DATABASE_REPLICAS:
+            self.mark_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        state = _RequestState()
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+        if state.wrote and settings.DATABASE_REPLICAS:
+            # Resolving a session user queries the database
+            await sync_to_async(self.mark_writer)(request)
+        return response
+
+    def mark_writer(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            mark_written(user.id)
+
+
+class ReplicaReadMixin:
+    """Let a DRF view read from replicas.
+
+    `replica_actions` names the viewset actions that may read stale
+    data; None allows every safe method of a generic view."""
+    replica_actions = None
+
+    def reads_from_replica(self, request):
+        if self.replica_actions is None:
+            return request.method in SAFE_METHODS
+        return getattr(self, 'action', None) in self.replica_actions
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _request_state.get()
+        if (state is not None and settings.DATABASE_REPLICAS
+                and self.reads_from_replica(request)
+                and not is_sticky(request.user.id)):
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        state = _request_state.get()
+        if state is not None:
+            state.replica = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,38 @@
+"""
+Django command to move old chat history into compressed archives
+"""
+from django.core.management.base import BaseCommand
+
+from core.archive import archive_cutoff, archive_month, months_to_archive
+
+
+class Command(BaseCommand):
+    """Archive every (group, month) of messages older than the hot
+    window"""
+
+    help = 'Move chat messages older than the hot window to archives.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=None,
+            help='Months of history kept in the database '
+                 '(default CHAT_ARCHIVE_AFTER_MONTHS).')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='List the months that would be archived.')
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        cutoff = archive_cutoff(months=options['months'])
+        archived = 0
+        for group_id, month in list(months_to_archive(cutoff)):
+            if options['dry_run']:
+                self.stdout.write(f'group {group_id}: {month:%Y-%m}')
+                continue
+            archive = archive_month(group_id, month)
+            if archive is not None:
+                archived += archive.message_count
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Archived {archived} message(s) older than {cutoff}.'))
@@ -0,0 +1,106 @@
+"""
+Django command comparing the throughput of a synchronous DRF read
+endpoint and an async one
+"""
+import asyncio
+import statistics
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import User
+
+
+async def _request(app, path, token):
+    """Send one GET through the ASGI application, as daphne would, and
+    return its status code."""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'localhost'),
+                    (b'authorization', f'Token {token}'.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    body_sent = False
+    response = {}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # Keep the connection open until the handler stops listening
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await app(scope, receive, send)
+    return response['status']
+
+
+async def _run(app, path, token, requests, concurrency):
+    """Issue `requests` GETs with `concurrency` in flight and return
+    the elapsed time, latencies and status codes."""
+    queue = iter(range(requests))
+    latencies, statuses = [], set()
+
+    async def client():
+        for _ in queue:
+            start = time.perf_counter()
+            statuses.add(await _request(app, path, token))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+class Command(BaseCommand):
+    """Serve user reads through the ASGI handler from the DRF `me/`
+    view and the async `info/` view; the benchmark user is deleted
+    afterwards"""
+
+    help = 'Benchmark a sync DRF view against an async view.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        app = get_asgi_application()
+        user = User.objects.create_user(
+            'benchmark-async@example.com', name='Benchmark')
+        try:
+            token = Token.objects.create(user=user).key
+            endpoints = [
+                ('sync', reverse('user:me')),
+                ('async', reverse('user:user-info')),
+            ]
+            for kind, path in endpoints:
+                elapsed, latencies, statuses = asyncio.run(_run(
+                    app, path, token, options['requests'],
+                    options['concurrency']))
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                self.stdout.write(
+                    f"{kind:<6} {path:<20} "
+                    f"throughput={len(latencies) / elapsed:.0f} req/s "
+                    f"p50={statistics.median(latencies) * 1000:.1f}ms "
+                    f"p95={p95 * 1000:.1f}ms "
+                    f"status={sorted(statuses)}")
+        finally:
+            user.delete()
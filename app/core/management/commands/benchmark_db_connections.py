@@ -0,0 +1,77 @@
+"""
+Django command measuring database connection churn of requests served
+through the ASGI handler
+"""
+import asyncio
+import statistics
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.management.commands.benchmark_async_views import _run
+from core.models import User
+
+
+class Command(BaseCommand):
+    """Serve the DRF `me/` view through the ASGI handler, as the servers
+    do, with CONN_MAX_AGE 0, with persistent connections and, given
+    --pooler, through a connection pooler, counting the database
+    connections opened; the benchmark user is deleted afterwards"""
+
+    help = 'Benchmark database connections opened by ASGI requests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--max-age', type=int, default=60)
+        parser.add_argument(
+            '--pooler', metavar='HOST:PORT',
+            help='Also run through a pooler such as PgBouncer.')
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        app = get_asgi_application()
+        settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+        original = dict(settings_dict)
+        runs = [('per-request', {'CONN_MAX_AGE': 0}),
+                ('persistent', {'CONN_MAX_AGE': options['max_age']})]
+        if options['pooler']:
+            host, _, port = options['pooler'].partition(':')
+            runs.append(('pooler', {'CONN_MAX_AGE': 0, 'HOST': host,
+                                    'PORT': port}))
+
+        opened = []
+
+        def count(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        user = User.objects.create_user(
+            'benchmark-connections@example.com', name='Benchmark')
+        connection_created.connect(count)
+        try:
+            token = Token.objects.create(user=user).key
+            for name, changes in runs:
+                # Connections of request threads read this shared dict
+                # when they open
+                settings_dict.update(changes)
+                opened.clear()
+                elapsed, latencies, statuses = asyncio.run(_run(
+                    app, reverse('user:me'), token, options['requests'],
+                    options['concurrency']))
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                self.stdout.write(
+                    f"{name:<12} "
+                    f"throughput={len(latencies) / elapsed:.0f} req/s "
+                    f"p50={statistics.median(latencies) * 1000:.1f}ms "
+                    f"p95={p95 * 1000:.1f}ms "
+                    f"connections={len(opened)} "
+                    f"status={sorted(statuses)}")
+        finally:
+            connection_created.disconnect(count)
+            settings_dict.clear()
+            settings_dict.update(original)
+            user.delete()
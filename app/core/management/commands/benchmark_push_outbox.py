@@ -0,0 +1,60 @@
+"""
+Django command benchmarking the push outbox worker against a fake SNS
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core import aws_sns
+from core.models import PushOutbox
+from core.push import process_batch
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """Measure outbox throughput offline; all rows are rolled back"""
+
+    help = 'Benchmark push outbox delivery against a fake SNS backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000)
+        parser.add_argument(
+            '--latency', type=float, default=0.02,
+            help='Simulated SNS round-trip in seconds.')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 8, 32])
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        messages = options['messages']
+        for concurrency in options['concurrency']:
+            client = aws_sns.FakeSNSClient(latency=options['latency'])
+            real_client, aws_sns.sns_client = aws_sns.sns_client, client
+            try:
+                with transaction.atomic():
+                    PushOutbox.objects.bulk_create(
+                        PushOutbox(kind=PushOutbox.KIND_PUBLISH,
+                                   endpoint_arn=f'arn:fake:{i}',
+                                   message='benchmark')
+                        for i in range(messages))
+
+                    start = time.perf_counter()
+                    while process_batch(options['batch_size'], concurrency):
+                        pass
+                    elapsed = time.perf_counter() - start
+                    raise _Rollback
+            except _Rollback:
+                pass
+            finally:
+                aws_sns.sns_client = real_client
+
+            self.stdout.write(
+                f"concurrency={concurrency:<4} "
+                f"published={len(client.calls):<6} "
+                f"elapsed={elapsed:.2f}s "
+                f"throughput={len(client.calls) / elapsed:.0f} msg/s")
@@ -0,0 +1,42 @@
+"""
+Django command measuring process startup with and without the SNS client
+"""
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+APP_DIR = Path(__file__).resolve().parents[3]
+
+SCENARIOS = {
+    'lazy': 'import django; django.setup(); import core.aws_sns',
+    'eager': ('import django; django.setup(); import core.aws_sns; '
+              'core.aws_sns.get_sns_client()'),
+}
+
+
+class Command(BaseCommand):
+    """Compare cold startup of a Django process, with the SNS client
+    built lazily versus at import time as it used to be"""
+
+    help = 'Benchmark process startup with lazy vs eager SNS client.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        for name, code in SCENARIOS.items():
+            timings = []
+            for _ in range(options['runs']):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, '-c', code],
+                               cwd=APP_DIR, check=True)
+                timings.append(time.perf_counter() - start)
+
+            self.stdout.write(
+                f"{name:<6} median={statistics.median(timings) * 1000:.0f}ms "
+                f"min={min(timings) * 1000:.0f}ms")
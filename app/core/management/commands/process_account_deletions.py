@@ -0,0 +1,39 @@
+"""
+Django command running the account deletion worker
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.account_deletion import process_next
+
+
+class Command(BaseCommand):
+    """Delete the data of accounts queued for deletion"""
+
+    help = 'Delete the data of accounts queued for deletion, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Run the due jobs and exit.')
+        parser.add_argument(
+            '--interval', type=float, default=5.0,
+            help='Seconds to sleep when no job is due.')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        self.stdout.write("Processing account deletions...")
+        total = 0
+        while True:
+            job = process_next(options['batch_size'])
+            if job is not None:
+                total += 1
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {total} account deletion(s)."))
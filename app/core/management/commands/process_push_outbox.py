@@ -0,0 +1,48 @@
+"""
+Django command running the push notification outbox worker
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import dispatch_events
+from core.push import process_batch, purge_outbox
+
+
+class Command(BaseCommand):
+    """Fan out notification events and deliver queued SNS work"""
+
+    help = ('Fan out notification events and deliver queued SNS '
+            'registrations and push notifications.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain the due entries and exit.')
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--concurrency', type=int, default=None)
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        self.stdout.write("Processing push outbox...")
+        total = 0
+        while True:
+            processed = dispatch_events()
+            processed += process_batch(options['batch_size'],
+                                       options['concurrency'])
+            total += processed
+            if processed:
+                continue
+            # Old sent and failed entries are only purged when idle
+            purged = purge_outbox()
+            if purged:
+                self.stdout.write(f"Purged {purged} old outbox entries.")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {total} events and outbox entries."))
@@ -0,0 +1,60 @@
+"""
+Django command to repair drift in denormalized workout counters
+"""
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.core.management.base import BaseCommand
+
+from core.models import Workout, Comment
+from workout import cache as feed_cache
+
+
+def _count_subquery(queryset):
+    """Count rows of `queryset` per outer workout."""
+    return Coalesce(Subquery(
+        queryset.order_by().values('workout_id')
+        .annotate(total=Count('pk')).values('total')), 0)
+
+
+class Command(BaseCommand):
+    """Recompute `comments_count` and `fires` for drifted workouts"""
+
+    help = 'Repair comments_count and fires drift on workouts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of workouts written per UPDATE statement.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted workouts without writing.')
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        likes = Workout.liked_by.through.objects.filter(
+            workout_id=OuterRef('pk'))
+        comments = Comment.objects.filter(workout_id=OuterRef('pk'))
+
+        drifted = list(
+            Workout.objects
+            .annotate(actual_comments=_count_subquery(comments),
+                      actual_fires=_count_subquery(likes))
+            .exclude(comments_count=F('actual_comments'),
+                     fires=F('actual_fires'))
+            .only('id', 'user_id', 'date', 'comments_count', 'fires'))
+
+        for workout in drifted:
+            workout.comments_count = workout.actual_comments
+            workout.fires = workout.actual_fires
+
+        if drifted and not options['dry_run']:
+            Workout.objects.bulk_update(
+                drifted, ['comments_count', 'fires'],
+                batch_size=options['batch_size'])
+            # bulk_update sends no signals
+            feed_cache.invalidate_workouts(
+                (workout.user_id, workout.date) for workout in drifted)
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(drifted)} drifted workout(s).'))
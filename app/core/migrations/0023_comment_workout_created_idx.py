@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_user_profile_picture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['workout', '-created_at', '-id'], name='comment_workout_created_idx'),
+        ),
+    ]
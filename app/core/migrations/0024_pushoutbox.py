@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:19
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_comment_workout_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('register', 'Register device'), ('publish', 'Publish notification')], max_length=16)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('device_token', models.CharField(blank=True, max_length=512)),
+                ('endpoint_arn', models.CharField(blank=True, max_length=512)),
+                ('message', models.TextField(blank=True)),
+                ('dedupe_key', models.CharField(max_length=600, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='pushoutbox_due_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pushoutbox',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('dedupe_key',), name='pushoutbox_pending_dedupe'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+def number_messages(apps, schema_editor):
+    """Number existing messages per group in the order they were sent."""
+    Group = apps.get_model('core', 'Group')
+    Message = apps.get_model('core', 'Message')
+    for group in Group.objects.only('id').iterator():
+        messages = list(Message.objects.filter(group_id=group.id)
+                        .order_by('timestamp', 'id').only('id'))
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        Message.objects.bulk_update(messages, ['seq'], batch_size=1000)
+        Group.objects.filter(pk=group.id).update(message_seq=len(messages))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_readmarker'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='message_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RenameField(
+            model_name='readmarker',
+            old_name='last_read_message_id',
+            new_name='last_read_seq',
+        ),
+        migrations.RunPython(number_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_message_seq'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('group', 'seq'), name='message_group_seq_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_message_group_seq_unique'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='group',
+            name='invite_code',
+            field=models.CharField(max_length=6, null=True, unique=True),
+        ),
+    ]
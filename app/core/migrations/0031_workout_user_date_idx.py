@@ -0,0 +1,17 @@
+# Generated by Django 5.0.14 on 2026-10-19 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_group_invite_code_on_save'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user', '-date'], name='workout_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-19 18:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_account_deletion'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='accountdeletion',
+            name='accountdeletion_due_idx',
+        ),
+        migrations.AddField(
+            model_name='accountdeletion',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='accountdeletion',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='accountdeletion_due_idx'),
+        ),
+    ]
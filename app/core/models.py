@@ -1,16 +1,17 @@
 import io
 import os
-import random
+import secrets
 import string
 import uuid
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import (
     BaseUserManager,
     AbstractBaseUser,
     PermissionsMixin
 )
 from django.conf import settings
+from django.utils import timezone
 from PIL import Image as PilImage, ExifTags
 from django.core.files.base import ContentFile
 
@@ -50,6 +51,11 @@ def process_image(image):
     return img_file
 
 
+def is_new_upload(image):
+    """Return True if the image field holds a file not yet stored."""
+    return bool(image) and not image._committed
+
+
 def user_image_file_path(instance, filename):
     """Generate new file path for user profile pic."""
     ext = os.path.splitext(filename)[1]
@@ -58,9 +64,14 @@ def user_image_file_path(instance, filename):
     return os.path.join('uploads', 'user', filename)
 
 
+INVITE_CODE_ATTEMPTS = 5
+
+
 def create_unique_invite_code(length=6):
+    """Return a random invite code; uniqueness is enforced on insert by
+    Group.save."""
     characters = string.ascii_uppercase + string.digits
-    code = ''.join(random.choice(characters) for _ in range(length))
+    code = ''.join(secrets.choice(characters) for _ in range(length))
     return code
 
 
@@ -100,7 +111,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
     def save(self, *args, **kwargs):
-        if self.profile_picture:
+        if is_new_upload(self.profile_picture):
             self.profile_picture = process_image(self.profile_picture)
 
         super().save(*args, **kwargs)
@@ -112,12 +123,28 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Group(models.Model):
     """Group model."""
     name = models.CharField(max_length=255)
-    invite_code = models.CharField(
-        max_length=6, unique=True,
-        default=create_unique_invite_code, null=True)
+    invite_code = models.CharField(max_length=6, unique=True, null=True)
     members = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
         related_name='group_memberships')
+    # Sequence number of the latest message, see Message.save
+    message_seq = models.PositiveBigIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.invite_code:
+            return super().save(*args, **kwargs)
+        # Let the unique index detect collisions instead of querying for
+        # every candidate; a collision only costs one more insert
+        for attempt in range(INVITE_CODE_ATTEMPTS):
+            self.invite_code = create_unique_invite_code()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if (attempt == INVITE_CODE_ATTEMPTS - 1
+                        or not Group.objects.filter(
+                            invite_code=self.invite_code).exists()):
+                    raise
 
     def __str__(self):
         return self.name
@@ -140,8 +167,14 @@ class Workout(models.Model):
         related_name='liked_workouts',
         blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-date'],
+                         name='workout_user_date_idx'),
+        ]
+
     def save(self, *args, **kwargs):
-        if self.image:
+        if is_new_upload(self.image):
             self.image = process_image(self.image)
 
         super().save(*args, **kwargs)
@@ -153,10 +186,36 @@ class Workout(models.Model):
 class Message(models.Model):
     """Message model"""
     content = models.TextField(max_length=1024)
-    group = models.ForeignKey(Group, on_delete=models.PROTECT)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    # Kept when the sender deletes their account
     sender = models.ForeignKey(settings.AUTH_USER_MODEL,
-                               on_delete=models.PROTECT)
+                               on_delete=models.SET_NULL, null=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    seq = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp'], name='message_timestamp_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'seq'],
+                                    name='message_group_seq_unique'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.seq:
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # The update locks the group row until commit, so concurrent
+            # senders are numbered one after another
+            updated = Group.objects.filter(pk=self.group_id).update(
+                message_seq=models.F('message_seq') + 1)
+            if not updated:
+                raise Group.DoesNotExist(
+                    'Group matching query does not exist.')
+            self.seq = (Group.objects.filter(pk=self.group_id)
+                        .values_list('message_seq', flat=True).get())
+            super().save(*args, **kwargs)
 
 
 class Comment(models.Model):
@@ -169,16 +228,204 @@ class Comment(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['workout', '-created_at', '-id'],
+                         name='comment_workout_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         is_new_comment = self.pk is None
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
-        if is_new_comment:
-            self.workout.comments_count += 1
-            self.workout.save()
+            if is_new_comment:
+                # Column-only update, never goes through Workout.save
+                updated = Workout.objects.filter(pk=self.workout_id).update(
+                    comments_count=models.F('comments_count') + 1)
+                if not updated:
+                    raise Workout.DoesNotExist(
+                        'Workout matching query does not exist.')
 
     def delete(self, *args, **kwargs):
-        workout = self.workout
-        workout.comments_count -= 1
-        workout.save()  # Update the count before deleting
-        super().delete(*args, **kwargs)
+        with transaction.atomic():
+            (Workout.objects
+             .filter(pk=self.workout_id, comments_count__gt=0)
+             .update(comments_count=models.F('comments_count') - 1))
+            return super().delete(*args, **kwargs)
+
+
+class Device(models.Model):
+    """Mobile device registered as an SNS platform endpoint."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='devices')
+    device_token = models.CharField(max_length=512, unique=True)
+    endpoint_arn = models.CharField(max_length=512)
+    subscription_arn = models.CharField(max_length=512, blank=True)
+    enabled = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.device_token
+
+
+class PushOutbox(models.Model):
+    """Pending SNS work processed by the push worker."""
+    KIND_REGISTER = 'register'
+    KIND_PUBLISH = 'publish'
+    KIND_CHOICES = [
+        (KIND_REGISTER, 'Register device'),
+        (KIND_PUBLISH, 'Publish notification'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True)
+    device_token = models.CharField(max_length=512, blank=True)
+    endpoint_arn = models.CharField(max_length=512, blank=True)
+    message = models.TextField(blank=True)
+    dedupe_key = models.CharField(max_length=600, null=True)
+    coalesce_key = models.CharField(max_length=255, null=True, db_index=True)
+    coalesced = models.PositiveIntegerField(default=1)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='pushoutbox_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status='pending'),
+                name='pushoutbox_pending_dedupe'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} ({self.status})'
+
+
+class NotificationEvent(models.Model):
+    """Activity waiting to be fanned out as push notifications."""
+    KIND_CHAT = 'chat'
+    KIND_COMMENT = 'comment'
+    KIND_CHOICES = [
+        (KIND_CHAT, 'Chat message'),
+        (KIND_COMMENT, 'Comment'),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True)
+    workout = models.ForeignKey(Workout, on_delete=models.CASCADE, null=True)
+    preview = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.kind} by {self.actor_id}'
+
+
+class ReadMarker(models.Model):
+    """Sequence number of the last chat message a user has read in
+    a group."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE)
+    last_read_seq = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'group'],
+                name='readmarker_user_group_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} read {self.group_id}'
+
+
+class MessageArchive(models.Model):
+    """Chat messages of one group and month moved to a compressed file."""
+    group = models.ForeignKey(Group, on_delete=models.CASCADE,
+                              related_name='message_archives')
+    month = models.DateField()
+    file = models.FileField(upload_to='archives/messages/')
+    first_seq = models.PositiveBigIntegerField()
+    last_seq = models.PositiveBigIntegerField()
+    message_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'month'],
+                         name='messagearchive_month_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.group_id} {self.month:%Y-%m}'
+
+
+class AccountDeletion(models.Model):
+    """Deletion of a user's data, run in batches by the account
+    deletion worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    # Lets the client poll progress after its token has been revoked
+    key = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    step = models.CharField(max_length=32, blank=True)
+    total_rows = models.PositiveBigIntegerField(null=True)
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    deleted_files = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Failed jobs wait here before being retried
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'],
+                         name='accountdeletion_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} ({self.status})'
@@ -0,0 +1,172 @@
+"""
+Fan-out of chat and comment activity into coalesced push notifications.
+
+Request and consumer code only records a NotificationEvent. The push
+worker expands events to recipients, skips users currently connected to
+the chat (with NOTIFICATION_SKIP_ONLINE), and coalesces bursts per
+(recipient, group/workout): the first event in a window is pushed
+immediately and every following one is merged into a single summary
+push sent when the window closes.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import presence
+from core.models import Device, Group, NotificationEvent, PushOutbox
+
+PREVIEW_LENGTH = 100
+
+
+def notify_chat_message(group_id, sender_id, content):
+    """Record a chat message for push delivery."""
+    NotificationEvent.objects.create(
+        kind=NotificationEvent.KIND_CHAT, group_id=group_id,
+        actor_id=sender_id, preview=content[:PREVIEW_LENGTH])
+
+
+def notify_comment(workout_id, author_id, text):
+    """Record a workout comment for push delivery."""
+    NotificationEvent.objects.create(
+        kind=NotificationEvent.KIND_COMMENT, workout_id=workout_id,
+        actor_id=author_id, preview=text[:PREVIEW_LENGTH])
+
+
+class _Notification:
+    """Events of one scope addressed to one recipient."""
+
+    def __init__(self, event):
+        self.event = event
+        self.count = 0
+
+    def add(self, event):
+        self.event = event
+        self.count += 1
+
+    @property
+    def is_chat(self):
+        return self.event.kind == NotificationEvent.KIND_CHAT
+
+    @property
+    def scope(self):
+        if self.is_chat:
+            return f'chat:{self.event.group_id}'
+        return f'workout:{self.event.workout_id}'
+
+    def message(self, count=None):
+        count = count or self.count
+        event = self.event
+        if self.is_chat:
+            if count == 1:
+                return (f'{event.actor.name} in {event.group.name}: '
+                        f'{event.preview}')
+            return f'{count} new messages in {event.group.name}'
+        if count == 1:
+            return (f'{event.actor.name} commented on '
+                    f'{event.workout.title}: {event.preview}')
+        return f'{count} new comments on {event.workout.title}'
+
+
+def _recipients(events):
+    """Map every event to the user ids that should be notified."""
+    group_ids = {event.group_id for event in events if event.group_id}
+    members = defaultdict(set)
+    for group_id, user_id in (Group.members.through.objects
+                              .filter(group_id__in=group_ids)
+                              .values_list('group_id', 'user_id')):
+        members[group_id].add(user_id)
+    online = {}
+    if settings.NOTIFICATION_SKIP_ONLINE:
+        online = {group_id: presence.online_user_ids(group_id, user_ids)
+                  for group_id, user_ids in members.items()}
+
+    for event in events:
+        if event.kind == NotificationEvent.KIND_CHAT:
+            users = (members.get(event.group_id, set())
+                     - online.get(event.group_id, set()))
+        else:
+            users = {event.workout.user_id}
+        yield event, users - {event.actor_id}
+
+
+def _is_open(entry, now, window):
+    """True if a queued summary push is still collecting events."""
+    return (entry.status == PushOutbox.STATUS_PENDING
+            and now < entry.next_attempt_at <= entry.created_at + window)
+
+
+def dispatch_events(batch_size=None):
+    """Turn one batch of notification events into outbox pushes.
+
+    Returns the number of events consumed."""
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    window = timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS)
+
+    with transaction.atomic():
+        events = list(NotificationEvent.objects
+                      .select_for_update(skip_locked=True, of=('self',))
+                      .select_related('actor', 'group', 'workout')
+                      .order_by('id')[:batch_size])
+        if not events:
+            return 0
+
+        notifications = {}
+        for event, user_ids in _recipients(events):
+            for user_id in user_ids:
+                key = (event.kind, event.group_id or event.workout_id,
+                       user_id)
+                notifications.setdefault(key, _Notification(event)).add(
+                    event)
+
+        endpoints = defaultdict(list)
+        for user_id, endpoint_arn in (Device.objects
+                                      .filter(user_id__in={
+                                          key[2] for key in notifications},
+                                          enabled=True)
+                                      .values_list('user_id',
+                                                   'endpoint_arn')):
+            endpoints[user_id].append(endpoint_arn)
+
+        now = timezone.now()
+        pending = {
+            (f'{n.scope}:{key[2]}', endpoint_arn): (key[2], n)
+            for key, n in notifications.items()
+            for endpoint_arn in endpoints[key[2]]
+        }
+        latest = {}
+        for entry in (PushOutbox.objects
+                      .filter(coalesce_key__in={k for k, _ in pending},
+                              created_at__gt=now - window)
+                      .order_by('created_at')):
+            latest[(entry.coalesce_key, entry.endpoint_arn)] = entry
+
+        updated, created = [], []
+        for (coalesce_key, endpoint_arn), (user_id, notification) in \
+                pending.items():
+            entry = latest.get((coalesce_key, endpoint_arn))
+            if entry is not None and _is_open(entry, now, window):
+                entry.coalesced += notification.count
+                entry.message = notification.message(entry.coalesced)
+                updated.append(entry)
+                continue
+            created.append(PushOutbox(
+                kind=PushOutbox.KIND_PUBLISH,
+                user_id=user_id,
+                endpoint_arn=endpoint_arn,
+                message=notification.message(),
+                coalesce_key=coalesce_key,
+                coalesced=notification.count,
+                # Leading push now, later ones wait for the window to close
+                next_attempt_at=(now if entry is None
+                                 else max(now, entry.created_at + window)),
+            ))
+
+        PushOutbox.objects.bulk_update(updated, ['coalesced', 'message'])
+        PushOutbox.objects.bulk_create(created)
+        NotificationEvent.objects.filter(
+            id__in=[event.id for event in events]).delete()
+
+    return len(events)
@@ -0,0 +1,187 @@
+"""
+Tracking of users connected to a group chat socket.
+
+Every open socket is one sorted set member scored by its expiry time,
+under the connections of its user in the group, and every online user is
+one member of the group's set, scored by the expiry of their latest
+socket. Updates therefore touch a single connection and user, whatever
+the size of the group, and run as one atomic Redis script without any
+lock. Presence costs no database writes.
+
+Only the Redis default cache (REDIS_URL) makes presence visible to other
+processes such as the push worker, see core.checks. With a process-local
+cache the same structure is kept in memory by `local_store`.
+
+Connections expire PRESENCE_TTL after their last heartbeat, which cleans
+up after crashed processes that never ran their disconnect handler.
+Every update removes the users whose last connection expired and reports
+them offline, so expiries produce presence deltas like disconnects do.
+"""
+import threading
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+# KEYS: online users of the group, connections of the user
+# ARGV: now, ttl, user id, channel name, '1' to connect or '0' to close
+UPDATE_SCRIPT = """
+local now, ttl = tonumber(ARGV[1]), tonumber(ARGV[2])
+local user, channel = ARGV[3], ARGV[4]
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local was_online = redis.call('ZCARD', KEYS[2]) > 0
+local online, offline = {}, {}
+for _, id in ipairs(expired) do
+    if id == user then was_online = true else table.insert(offline, id) end
+end
+if ARGV[5] == '1' then
+    redis.call('ZADD', KEYS[2], now + ttl, channel)
+else
+    redis.call('ZREM', KEYS[2], channel)
+end
+local latest = redis.call('ZRANGE', KEYS[2], -1, -1, 'WITHSCORES')
+if #latest > 0 then
+    redis.call('ZADD', KEYS[1], latest[2], user)
+    redis.call('EXPIRE', KEYS[1], ttl)
+    redis.call('EXPIRE', KEYS[2], ttl)
+    if not was_online then table.insert(online, user) end
+else
+    redis.call('ZREM', KEYS[1], user)
+    if was_online then table.insert(offline, user) end
+end
+return {online, offline}
+"""
+
+
+class RedisStore:
+    """Presence kept in the Redis server of the default cache."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _key(self, group_id, user_id=None):
+        # The hash tag keeps the keys of a group on one cluster node
+        key = f'presence:{{{group_id}}}'
+        if user_id is not None:
+            key = f'{key}:{user_id}'
+        return self.cache.make_key(key)
+
+    def _client(self, key, write=False):
+        return self.cache._cache.get_client(key, write=write)
+
+    def update(self, group_id, user_id, channel_name, connected, now, ttl):
+        keys = [self._key(group_id), self._key(group_id, user_id)]
+        client = self._client(keys[0], write=True)
+        online, offline = client.register_script(UPDATE_SCRIPT)(
+            keys=keys,
+            args=[now, ttl, user_id, channel_name, int(connected)])
+        return set(map(int, online)), set(map(int, offline))
+
+    def online(self, group_id, user_ids, now):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return set()
+        key = self._key(group_id)
+        expiries = self._client(key).zmscore(key, user_ids)
+        return {user_id for user_id, expires in zip(user_ids, expiries)
+                if expires is not None and expires > now}
+
+
+class LocalStore:
+    """Presence kept in memory, for a single process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # group id -> {user id: expiry of their latest connection}
+        self._users = {}
+        # (group id, user id) -> {channel name: expiry}
+        self._connections = {}
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._connections.clear()
+
+    def update(self, group_id, user_id, channel_name, connected, now, ttl):
+        with self._lock:
+            users = self._users.setdefault(group_id, {})
+            expired = {other for other, expires in users.items()
+                       if expires <= now}
+            for other in expired:
+                del users[other]
+                self._connections.pop((group_id, other), None)
+            connections = {
+                channel: expires for channel, expires
+                in self._connections.get((group_id, user_id), {}).items()
+                if expires > now}
+            was_online = bool(connections) or user_id in expired
+
+            if connected:
+                connections[channel_name] = now + ttl
+            else:
+                connections.pop(channel_name, None)
+
+            offline = expired - {user_id}
+            if connections:
+                self._connections[(group_id, user_id)] = connections
+                users[user_id] = max(connections.values())
+            else:
+                self._connections.pop((group_id, user_id), None)
+                users.pop(user_id, None)
+                if was_online:
+                    offline.add(user_id)
+            if not users:
+                del self._users[group_id]
+        online = {user_id} if connections and not was_online else set()
+        return online, offline
+
+    def online(self, group_id, user_ids, now):
+        with self._lock:
+            users = self._users.get(group_id, {})
+            return {user_id for user_id in user_ids
+                    if users.get(user_id, 0) > now}
+
+
+local_store = LocalStore()
+
+
+def _store():
+    cache = caches['default']
+    if isinstance(cache, RedisCache):
+        return RedisStore(cache)
+    return local_store
+
+
+def _update(group_id, user_id, channel_name, connected):
+    return _store().update(group_id, user_id, channel_name, connected,
+                           time(), settings.PRESENCE_TTL)
+
+
+def mark_connected(group_id, user_id, channel_name):
+    """Record an open socket of a user in a group.
+
+    Returns the sets of user ids that came online and went offline."""
+    return _update(group_id, user_id, channel_name, True)
+
+
+def mark_disconnected(group_id, user_id, channel_name):
+    """Record a closed socket of a user in a group.
+
+    Returns the sets of user ids that came online and went offline."""
+    return _update(group_id, user_id, channel_name, False)
+
+
+def heartbeat(group_id, user_id, channel_name):
+    """Extend the presence of an open socket, restoring it if it had
+    expired.
+
+    Returns the sets of user ids that came online and went offline."""
+    return _update(group_id, user_id, channel_name, True)
+
+
+def online_user_ids(group_id, user_ids):
+    """Return the subset of `user_ids` connected to the group chat."""
+    return _store().online(group_id, user_ids, time())
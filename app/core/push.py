@@ -0,0 +1,181 @@
+"""
+Background delivery of SNS push work through the PushOutbox table.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import aws_sns
+from core.models import Device, PushOutbox
+
+# How long a claimed entry stays invisible to other workers
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def register_device(user, device_token):
+    """Make sure a device token has an SNS endpoint for `user`.
+
+    Known, enabled devices never contact SNS; a device that moved to
+    another account is only re-linked. New or disabled devices are
+    queued for registration."""
+    device = (Device.objects
+              .filter(device_token=device_token)
+              .only('id', 'user_id', 'enabled')
+              .first())
+    if device is None or not device.enabled:
+        enqueue_registration(user, device_token)
+    elif device.user_id != user.id:
+        Device.objects.filter(pk=device.pk).update(user=user)
+
+
+def enqueue_registration(user, device_token):
+    """Queue SNS endpoint registration for a device token.
+
+    A token already waiting for registration is not queued twice."""
+    PushOutbox.objects.bulk_create([PushOutbox(
+        kind=PushOutbox.KIND_REGISTER,
+        user=user,
+        device_token=device_token,
+        dedupe_key=f'register:{device_token}',
+    )], ignore_conflicts=True)
+
+
+def enqueue_push(endpoint_arn, message, user=None):
+    """Queue a push notification to an SNS endpoint."""
+    return PushOutbox.objects.create(
+        kind=PushOutbox.KIND_PUBLISH,
+        user=user,
+        endpoint_arn=endpoint_arn,
+        message=message,
+    )
+
+
+def _claim(batch_size):
+    """Lock and lease a batch of due entries for this worker."""
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            PushOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=PushOutbox.STATUS_PENDING,
+                    next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size])
+        PushOutbox.objects.filter(
+            id__in=[entry.id for entry in entries]
+        ).update(next_attempt_at=now + CLAIM_LEASE)
+    return entries
+
+
+def _is_endpoint_disabled(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'EndpointDisabled'
+
+
+def _deliver(entry):
+    """Perform the SNS calls for an entry, returning an error or None."""
+    try:
+        if entry.kind == PushOutbox.KIND_REGISTER:
+            entry.endpoint_arn = aws_sns.create_endpoint(entry.device_token)
+            entry.subscription_arn = aws_sns.subscribe_user_to_topic(
+                entry.endpoint_arn)
+        else:
+            aws_sns.send_push_notification(entry.endpoint_arn, entry.message)
+    except Exception as e:
+        entry.endpoint_disabled = _is_endpoint_disabled(e)
+        return str(e) or e.__class__.__name__
+    return None
+
+
+def _save_devices(entries):
+    """Upsert the devices registered by successful entries."""
+    devices = {
+        entry.device_token: Device(
+            user_id=entry.user_id,
+            device_token=entry.device_token,
+            endpoint_arn=entry.endpoint_arn,
+            subscription_arn=entry.subscription_arn,
+            enabled=True)
+        for entry in entries
+        if entry.kind == PushOutbox.KIND_REGISTER and entry.user_id
+    }
+    if devices:
+        Device.objects.bulk_create(
+            devices.values(),
+            update_conflicts=True,
+            unique_fields=['device_token'],
+            update_fields=['user', 'endpoint_arn', 'subscription_arn',
+                           'enabled', 'updated_at'])
+
+
+def _backoff(attempts):
+    return timedelta(
+        seconds=settings.PUSH_OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1))
+
+
+def process_batch(batch_size=None, concurrency=None):
+    """Deliver one batch of due outbox entries.
+
+    SNS calls run concurrently outside any transaction and the results
+    are written back with a single bulk update. Returns the number of
+    entries processed."""
+    entries = _claim(batch_size or settings.PUSH_OUTBOX_BATCH_SIZE)
+    if not entries:
+        return 0
+
+    with ThreadPoolExecutor(
+            max_workers=concurrency or settings.PUSH_OUTBOX_CONCURRENCY
+    ) as executor:
+        errors = list(executor.map(_deliver, entries))
+
+    now = timezone.now()
+    sent, disabled = [], set()
+    for entry, error in zip(entries, errors):
+        if error is None:
+            entry.status = PushOutbox.STATUS_SENT
+            entry.last_error = ''
+            sent.append(entry)
+            continue
+        entry.attempts += 1
+        entry.last_error = error
+        if entry.endpoint_disabled:
+            # Retrying cannot succeed until the device logs in again
+            entry.status = PushOutbox.STATUS_FAILED
+            disabled.add(entry.endpoint_arn)
+        elif entry.attempts >= settings.PUSH_OUTBOX_MAX_ATTEMPTS:
+            entry.status = PushOutbox.STATUS_FAILED
+        else:
+            entry.next_attempt_at = now + _backoff(entry.attempts)
+
+    with transaction.atomic():
+        PushOutbox.objects.bulk_update(
+            entries, ['status', 'endpoint_arn', 'attempts',
+                      'next_attempt_at', 'last_error'])
+        _save_devices(sent)
+        if disabled:
+            Device.objects.filter(endpoint_arn__in=disabled).update(
+                enabled=False)
+    return len(entries)
+
+
+def purge_outbox(batch_size=None):
+    """Delete sent and failed entries older than the retention period.
+
+    A finished entry keeps the lease of its last claim as
+    next_attempt_at, so the age is read from the (status,
+    next_attempt_at) index. Rows are deleted in batches to keep each
+    transaction short. Returns the number of entries deleted."""
+    batch_size = batch_size or settings.PUSH_OUTBOX_PURGE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(
+        days=settings.PUSH_OUTBOX_RETENTION_DAYS)
+    expired = PushOutbox.objects.filter(
+        status__in=[PushOutbox.STATUS_SENT, PushOutbox.STATUS_FAILED],
+        next_attempt_at__lt=cutoff)
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += PushOutbox.objects.filter(id__in=ids).delete()[0]
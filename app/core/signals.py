@@ -0,0 +1,13 @@
+"""
+Signal handlers of the core app.
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from core.models import MessageArchive
+
+
+@receiver(post_delete, sender=MessageArchive)
+def delete_archive_file(sender, instance, **kwargs):
+    """Remove the archive file together with its row."""
+    instance.file.delete(save=False)
@@ -0,0 +1,154 @@
+"""
+Tests for asynchronous account deletion
+"""
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core import account_deletion
+from core.models import (
+    AccountDeletion,
+    Comment,
+    Group,
+    Message,
+    ReadMarker,
+    Workout,
+)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AccountDeletionTests(TestCase):
+    """Test the account deletion worker"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            'user@example.com', 'testpass123', name='Leaving')
+        self.friend = User.objects.create_user(
+            'friend@example.com', 'testpass123', name='Friend')
+
+        self.workouts = [Workout.objects.create(
+            user=self.user, title=f'Run {i}', date=date.today())
+            for i in range(3)]
+        self.workouts[0].image.save('run.jpg', ContentFile(b'jpg'))
+        self.image_name = self.workouts[0].image.name
+        Comment.objects.create(workout=self.workouts[0], author=self.friend,
+                               text='Nice')
+        self.workouts[0].liked_by.add(self.friend)
+
+        self.friend_workout = Workout.objects.create(
+            user=self.friend, title='Swim', date=date.today(), fires=1)
+        self.friend_workout.liked_by.add(self.user)
+        Comment.objects.create(workout=self.friend_workout, author=self.user,
+                               text='Great')
+
+        self.shared = Group.objects.create(name='Shared')
+        self.shared.members.add(self.user, self.friend)
+        self.solo = Group.objects.create(name='Solo')
+        self.solo.members.add(self.user)
+        self.message = Message.objects.create(
+            group=self.shared, sender=self.user, content='Bye')
+        ReadMarker.objects.create(user=self.user, group=self.shared)
+        Token.objects.create(user=self.user)
+
+    def test_request_revokes_access(self):
+        """Test queueing a deletion deactivates the account at once"""
+        job = account_deletion.request_deletion(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(self.user.has_usable_password())
+        self.assertNotEqual(self.user.email, 'user@example.com')
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertEqual(job.status, AccountDeletion.STATUS_PENDING)
+        self.assertTrue(Workout.objects.filter(user=self.user).exists())
+
+    def test_worker_deletes_user_data(self):
+        """Test the worker removes the user's rows and files in batches"""
+        job = account_deletion.request_deletion(self.user)
+
+        call_command('process_account_deletions', '--once',
+                     '--batch-size', '2', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AccountDeletion.STATUS_DONE)
+        self.assertEqual(job.deleted_rows, job.total_rows)
+        self.assertEqual(job.deleted_files, 1)
+        self.assertIsNone(job.user)
+        self.assertFalse(get_user_model().objects.filter(
+            pk=self.user.pk).exists())
+        self.assertFalse(Workout.objects.filter(
+            pk__in=[w.pk for w in self.workouts]).exists())
+        self.assertFalse(Workout.image.field.storage.exists(self.image_name))
+        self.assertFalse(Comment.objects.filter(text='Nice').exists())
+
+    def test_counters_and_shared_data(self):
+        """Test other users' counters, groups and chat history are kept
+        consistent"""
+        account_deletion.request_deletion(self.user)
+
+        account_deletion.process_next()
+
+        self.friend_workout.refresh_from_db()
+        self.assertEqual(self.friend_workout.fires, 0)
+        self.assertEqual(self.friend_workout.comments_count, 0)
+        self.assertFalse(self.friend_workout.comments.exists())
+        self.assertFalse(Group.objects.filter(pk=self.solo.pk).exists())
+        self.assertEqual(list(self.shared.members.all()), [self.friend])
+        self.message.refresh_from_db()
+        self.assertIsNone(self.message.sender)
+
+    @override_settings(ACCOUNT_DELETION_BACKOFF_SECONDS=60)
+    def test_failed_job_is_retried_after_backoff(self):
+        """Test a job interrupted by an error runs again once its
+        backoff has passed"""
+        job = account_deletion.request_deletion(self.user)
+
+        with patch('core.account_deletion._anonymize_batch',
+                   side_effect=RuntimeError('boom')):
+            account_deletion.process_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AccountDeletion.STATUS_PENDING)
+        self.assertEqual(job.last_error, 'boom')
+        self.assertGreater(job.next_attempt_at,
+                           timezone.now() + timedelta(seconds=50))
+        self.assertIsNone(account_deletion.process_next())
+
+        AccountDeletion.objects.filter(pk=job.pk).update(
+            next_attempt_at=timezone.now())
+        account_deletion.process_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AccountDeletion.STATUS_DONE)
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_fails_after_max_attempts(self):
+        """Test a job that keeps failing is given up on"""
+        job = account_deletion.request_deletion(self.user)
+        AccountDeletion.objects.filter(pk=job.pk).update(
+            attempts=account_deletion.MAX_ATTEMPTS - 1)
+
+        with patch('core.account_deletion._anonymize_batch',
+                   side_effect=RuntimeError('boom')):
+            account_deletion.process_next()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AccountDeletion.STATUS_FAILED)
+        self.assertIsNone(account_deletion.process_next())
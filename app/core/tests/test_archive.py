@@ -0,0 +1,132 @@
+"""
+Tests for archiving old chat history
+"""
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import archive
+from core.models import Group, Message, MessageArchive
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CHAT_ARCHIVE_AFTER_MONTHS=6)
+class ArchiveTests(TestCase):
+    """Test moving old messages into archives"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.group = Group.objects.create(name='Test Group')
+        self.old = timezone.now() - timedelta(days=400)
+        self.old_messages = [self.message(f'Old {i}', self.old)
+                             for i in range(3)]
+        self.recent = self.message('Recent')
+
+    def message(self, content, timestamp=None):
+        message = Message.objects.create(
+            group=self.group, sender=self.user, content=content)
+        if timestamp is not None:
+            Message.objects.filter(id=message.id).update(timestamp=timestamp)
+        return message
+
+    def test_add_months(self):
+        """Test month arithmetic across years"""
+        self.assertEqual(archive.add_months(date(2024, 11, 1), 3),
+                         date(2025, 2, 1))
+        self.assertEqual(archive.add_months(date(2024, 2, 1), -6),
+                         date(2023, 8, 1))
+
+    def test_archive_old_messages(self):
+        """Test old messages are moved to a file and recent ones kept"""
+        out = StringIO()
+        call_command('archive_messages', stdout=out)
+
+        self.assertIn('Archived 3 message(s)', out.getvalue())
+        stored = MessageArchive.objects.get(group=self.group)
+        self.assertEqual(stored.month, timezone.localdate(self.old).replace(
+            day=1))
+        self.assertEqual((stored.first_seq, stored.last_seq), (1, 3))
+        self.assertEqual(
+            [m['content'] for m in archive.read_archive(stored)],
+            ['Old 0', 'Old 1', 'Old 2'])
+        self.assertEqual(list(Message.objects.values_list('id', flat=True)),
+                         [self.recent.id])
+
+    def test_failed_archive_removes_file(self):
+        """Test a rolled back archive leaves no stored file behind"""
+        month = timezone.localdate(self.old).replace(day=1)
+        directory = os.path.join(MEDIA_ROOT, 'archives', 'messages',
+                                 str(self.group.id))
+
+        def stored_files():
+            if not os.path.isdir(directory):
+                return set()
+            return set(os.listdir(directory))
+
+        before = stored_files()
+        with patch.object(MessageArchive, 'save',
+                          side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                archive.archive_month(self.group.id, month)
+
+        self.assertEqual(Message.objects.count(), 4)
+        self.assertEqual(stored_files(), before)
+
+    def test_archived_messages_are_paged_newest_first(self):
+        """Test slices of several archives read only what they need"""
+        older = self.old - timedelta(days=62)
+        for i in range(2):
+            self.message(f'Older {i}', older)
+        call_command('archive_messages', stdout=StringIO())
+        messages = archive.ArchivedMessages(
+            MessageArchive.objects.order_by('-month', '-first_seq'))
+
+        self.assertEqual(len(messages), 5)
+        self.assertEqual([m['content'] for m in messages[1:4]],
+                         ['Old 1', 'Old 0', 'Older 1'])
+        self.assertEqual(messages[-1]['content'], 'Older 0')
+        with self.assertRaises(IndexError):
+            messages[5]
+
+    def test_dry_run_keeps_messages(self):
+        """Test a dry run only lists the months to archive"""
+        out = StringIO()
+        call_command('archive_messages', '--dry-run', stdout=out)
+
+        self.assertIn(f'group {self.group.id}:', out.getvalue())
+        self.assertFalse(MessageArchive.objects.exists())
+        self.assertEqual(Message.objects.count(), 4)
+
+    def test_deleting_group_removes_history(self):
+        """Test deleting a group deletes its messages and archive files"""
+        call_command('archive_messages', stdout=StringIO())
+        stored = MessageArchive.objects.get(group=self.group)
+        storage, name = stored.file.storage, stored.file.name
+
+        self.group.delete()
+
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(storage.exists(name))
+
+    def test_deleting_sender_keeps_messages(self):
+        """Test messages outlive the account that sent them"""
+        self.user.delete()
+
+        self.recent.refresh_from_db()
+        self.assertIsNone(self.recent.sender)
@@ -0,0 +1,60 @@
+"""
+Tests for the async read endpoints
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+
+USER_INFO_URL = reverse('user:user-info')
+
+
+class AsyncApiTests(TestCase):
+    """Test async views authenticate like the DRF views"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            'user@example.com', 'testpass123', name='User')
+        self.auth = {'HTTP_AUTHORIZATION':
+                     f'Token {Token.objects.create(user=self.user).key}'}
+
+    def test_requires_token(self):
+        """Test async views reject missing and unknown tokens"""
+        res = self.client.get(USER_INFO_URL)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+        res = self.client.get(USER_INFO_URL, HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.json(), {'detail': 'Invalid token.'})
+
+    def test_malformed_header(self):
+        """Test a token header with extra parts is rejected"""
+        res = self.client.get(USER_INFO_URL,
+                              HTTP_AUTHORIZATION='Token a b')
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.json(), {'detail': 'Invalid token header.'})
+
+    def test_inactive_user(self):
+        """Test tokens of deactivated users are refused"""
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(USER_INFO_URL, **self.auth)
+
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.json(),
+                         {'detail': 'User inactive or deleted.'})
+
+    def test_matches_drf_response(self):
+        """Test the async view renders like the DRF views"""
+        res = self.client.get(USER_INFO_URL, **self.auth)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(res.json()['email'], self.user.email)
+        self.assertIsNone(res.json()['profile_picture'])
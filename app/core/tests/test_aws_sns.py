@@ -0,0 +1,49 @@
+"""
+Tests for the SNS client wrapper
+"""
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core import aws_sns
+
+APP_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+@patch('core.aws_sns.sns_client', None)
+class SNSClientTests(SimpleTestCase):
+    """Test lazy SNS client construction."""
+
+    @override_settings(AWS_SNS_BACKEND='boto3',
+                       AWS_SNS_MAX_POOL_CONNECTIONS=50,
+                       AWS_SNS_TCP_KEEPALIVE=True)
+    def test_client_built_once_with_pool_config(self):
+        """Test the boto3 client is created lazily and reused"""
+        self.assertIsNone(aws_sns.sns_client)
+
+        client = aws_sns.get_sns_client()
+
+        self.assertIs(aws_sns.get_sns_client(), client)
+        self.assertEqual(client.meta.config.max_pool_connections, 50)
+        self.assertTrue(client.meta.config.tcp_keepalive)
+
+    @override_settings(AWS_SNS_BACKEND='fake')
+    def test_fake_backend(self):
+        """Test the fake backend never builds a boto3 client"""
+        self.assertIsInstance(aws_sns.get_sns_client(),
+                              aws_sns.FakeSNSClient)
+
+    def test_import_does_not_load_boto3(self):
+        """Test importing the module leaves boto3 unimported"""
+        code = (
+            'import sys, django; django.setup(); import core.aws_sns; '
+            'print("boto3" in sys.modules)'
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=APP_DIR,
+            capture_output=True, text=True, check=True)
+
+        self.assertEqual(result.stdout.strip(), 'False')
@@ -1,13 +1,18 @@
 """
 Test custom django management commands
 """
+from datetime import date
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from core.models import Workout, Comment
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +37,45 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class ReconcileCountersTests(TestCase):
+    """Test the reconcile_counters command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.workout = Workout.objects.create(user=self.user,
+                                              date=date.today())
+        Comment.objects.create(workout=self.workout, author=self.user,
+                               text='Nice')
+        self.workout.liked_by.add(self.user)
+
+    def test_repairs_drifted_counters(self):
+        """Test drifted counters are recomputed from related rows"""
+        Workout.objects.filter(pk=self.workout.pk).update(
+            comments_count=7, fires=3)
+        untouched = Workout.objects.create(user=self.user,
+                                           date=date.today())
+
+        out = StringIO()
+        with self.assertNumQueries(2):
+            call_command('reconcile_counters', stdout=out)
+
+        self.workout.refresh_from_db()
+        untouched.refresh_from_db()
+        self.assertEqual(self.workout.comments_count, 1)
+        self.assertEqual(self.workout.fires, 1)
+        self.assertEqual(untouched.comments_count, 0)
+        self.assertIn('Repaired 1', out.getvalue())
+
+    def test_dry_run_does_not_write(self):
+        """Test dry run only reports drift"""
+        Workout.objects.filter(pk=self.workout.pk).update(comments_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+
+        self.workout.refresh_from_db()
+        self.assertEqual(self.workout.comments_count, 7)
+        self.assertIn('Found 1', out.getvalue())
@@ -0,0 +1,161 @@
+"""
+Tests for read replica routing
+
+The view tests register a second SQLite database as the replica,
+holding its own rows, so they see which database a request really read.
+"""
+import os
+import random
+import shutil
+import tempfile
+from datetime import date
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import db_routing
+from core.models import Workout
+from workout import cache as feed_cache
+
+WORKOUT_URL = reverse('workout:workout-list')
+WORKOUT_BY_DATE = reverse('workout:workout-get-by-date')
+
+REPLICA = 'replica'
+
+FEED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'feed-test',
+    },
+}
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    """Test the replica router outside of requests"""
+
+    def setUp(self):
+        self.router = db_routing.ReplicaRouter()
+        self.state = db_routing._RequestState()
+        self.token = db_routing._request_state.set(self.state)
+
+    def tearDown(self):
+        db_routing._request_state.reset(self.token)
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads outside opted-in views use the primary"""
+        self.assertIsNone(self.router.db_for_read(Workout))
+
+    def test_opted_in_reads_use_replica(self):
+        """Test opted-in reads are sent to a replica"""
+        self.state.replica = 'replica'
+
+        self.assertEqual(self.router.db_for_read(Workout), 'replica')
+
+    def test_reads_after_write_use_primary(self):
+        """Test a request that wrote reads its own writes"""
+        self.state.replica = 'replica'
+
+        self.assertIsNone(self.router.db_for_write(Workout))
+        self.assertIsNone(self.router.db_for_read(Workout))
+
+    def test_replicas_are_not_migrated(self):
+        """Test migrations only run on the primary"""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica', 'core'))
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaViewTests(TestCase):
+    """Test views reading from replicas"""
+    @classmethod
+    def setUpClass(cls):
+        # Registered here rather than at import so that only these
+        # tests pay for a second test database, which the test runner
+        # therefore does not know about
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings[REPLICA] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: {},
+            REPLICA: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+                'TEST': {'NAME': os.path.join(cls.replica_dir,
+                                              'test_replica.sqlite3')},
+            },
+        })[REPLICA]
+        connections[REPLICA].creation.create_test_db(verbosity=0,
+                                                     serialize=False)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].creation.destroy_test_db(
+            os.path.join(cls.replica_dir, 'replica.sqlite3'), verbosity=0)
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.user.save(using=REPLICA)
+        # Rows on the replica differ from the primary, as if it lagged
+        Workout.objects.create(user=self.user, title='Primary',
+                               date=date.today())
+        Workout.objects.using(REPLICA).create(
+            user=self.user, title='Replica', date=date.today())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def feed_titles(self):
+        res = self.client.get(WORKOUT_BY_DATE)
+        self.assertEqual(res.status_code, 200)
+        return [workout['title'] for workout in res.data]
+
+    def test_feed_reads_from_replica(self):
+        """Test the feed is read from a replica"""
+        self.assertEqual(self.feed_titles(), ['Replica'])
+
+    @override_settings(CACHES=FEED_CACHES)
+    def test_cached_feed_is_built_from_primary(self):
+        """Test a feed stored in the cache is not read from a replica"""
+        feed_cache.clear()
+
+        self.assertEqual(self.feed_titles(), ['Primary'])
+        self.assertEqual(self.feed_titles(), ['Primary'])
+        self.assertEqual(feed_cache.stats.snapshot()['hits'], 1)
+
+    def test_replica_is_picked_once_per_request(self):
+        """Test every read of a request uses the same replica"""
+        with patch('core.db_routing.random.choice',
+                   wraps=random.choice) as choice:
+            self.feed_titles()
+
+        choice.assert_called_once_with([REPLICA])
+
+    def test_writer_is_sticky(self):
+        """Test a user's reads stay on the primary after a write"""
+        res = self.client.post(WORKOUT_URL, {
+            'title': 'Run', 'date': date.today()}, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(db_routing.is_sticky(self.user.id))
+
+        self.assertCountEqual(self.feed_titles(), ['Primary', 'Run'])
+
+    def test_other_views_read_from_primary(self):
+        """Test views without opt-in read from the primary"""
+        res = self.client.get(WORKOUT_URL)
+
+        self.assertEqual([workout['title'] for workout in res.data],
+                         ['Primary'])
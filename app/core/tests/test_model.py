@@ -1,8 +1,23 @@
 """tests for models"""
+from datetime import date
+from io import BytesIO
+from unittest.mock import patch
 
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
+from core.models import Group, Workout
+
+
+def create_image_upload(name='workout.jpg'):
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
 
 def create_user(email='user@example.com', password='testpass123'):
     return get_user_model().objects.create_user(email=email, password=password)
@@ -32,3 +47,69 @@ class ModelTest(TestCase):
         """Test if creating user without email is an error"""
         with self.assertRaises(ValueError):
             get_user_model().objects.create_user('', 'test123')
+
+
+class WorkoutImageProcessingTest(TestCase):
+    """Test image processing only runs for new uploads"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.workout = Workout.objects.create(
+            user=self.user, date=date.today(), image=create_image_upload())
+
+    def tearDown(self):
+        self.workout.image.delete()
+
+    def test_new_upload_is_processed(self):
+        """test a newly assigned image goes through Pillow"""
+        self.workout.image.delete(save=False)
+        self.workout.image = create_image_upload()
+        with patch('core.models.PilImage.open',
+                   wraps=Image.open) as patched_open:
+            self.workout.save()
+
+        patched_open.assert_called_once()
+
+    def test_counter_update_skips_pillow(self):
+        """test saving without a new image never calls Pillow"""
+        stored_name = self.workout.image.name
+        with patch('core.models.PilImage.open') as patched_open:
+            self.workout.fires += 1
+            self.workout.save()
+            workout = Workout.objects.get(pk=self.workout.pk)
+            workout.title = 'Leg day'
+            workout.save()
+
+        patched_open.assert_not_called()
+        workout.refresh_from_db()
+        self.assertEqual(workout.image.name, stored_name)
+
+
+class GroupInviteCodeTest(TestCase):
+    """Test invite code allocation"""
+
+    def test_new_group_gets_invite_code(self):
+        """test a group is created with a six character code"""
+        group = Group.objects.create(name='Group')
+
+        self.assertEqual(len(group.invite_code), 6)
+
+    @patch('core.models.create_unique_invite_code')
+    def test_collision_retries_with_new_code(self, create_code):
+        """test a colliding code is replaced on insert"""
+        Group.objects.create(name='First', invite_code='AAAAAA')
+        create_code.side_effect = ['AAAAAA', 'BBBBBB']
+
+        group = Group.objects.create(name='Second')
+
+        self.assertEqual(group.invite_code, 'BBBBBB')
+        self.assertEqual(create_code.call_count, 2)
+
+    @patch('core.models.create_unique_invite_code', return_value='AAAAAA')
+    def test_retries_are_bounded(self, create_code):
+        """test allocation gives up after a fixed number of attempts"""
+        Group.objects.create(name='First', invite_code='AAAAAA')
+
+        with self.assertRaises(IntegrityError):
+            Group.objects.create(name='Second')
+        self.assertEqual(create_code.call_count, 5)
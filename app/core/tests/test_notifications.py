@@ -0,0 +1,157 @@
+"""
+Tests for notification fan-out and coalescing
+"""
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.checks import Error
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from core import presence
+from core.checks import check_presence_cache
+from core.models import (
+    Device,
+    Group,
+    NotificationEvent,
+    PushOutbox,
+    Workout,
+)
+from core.notifications import (
+    dispatch_events,
+    notify_chat_message,
+    notify_comment,
+)
+
+
+def create_user(email, name):
+    user = get_user_model().objects.create_user(email, 'testpass123',
+                                                name=name)
+    Device.objects.create(user=user, device_token=f'token-{email}',
+                          endpoint_arn=f'arn:fake:{email}')
+    return user
+
+
+@override_settings(NOTIFICATION_COALESCE_SECONDS=60)
+class NotificationDispatchTests(TestCase):
+    """Test turning events into push outbox entries."""
+
+    def setUp(self):
+        cache.clear()
+        presence.local_store.clear()
+        self.sender = create_user('sender@example.com', 'Sender')
+        self.friend = create_user('friend@example.com', 'Friend')
+        self.group = Group.objects.create(name='Gym')
+        self.group.members.add(self.sender, self.friend)
+
+    def pushes(self):
+        return PushOutbox.objects.filter(
+            kind=PushOutbox.KIND_PUBLISH).order_by('id')
+
+    def test_chat_message_notifies_other_members(self):
+        """Test members except the sender get a push"""
+        notify_chat_message(self.group.id, self.sender.id, 'Leg day?')
+
+        self.assertEqual(dispatch_events(), 1)
+
+        push = self.pushes().get()
+        self.assertEqual(push.user, self.friend)
+        self.assertEqual(push.endpoint_arn, 'arn:fake:friend@example.com')
+        self.assertEqual(push.message, 'Sender in Gym: Leg day?')
+        self.assertLessEqual(push.next_attempt_at, timezone.now())
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    @override_settings(NOTIFICATION_SKIP_ONLINE=True)
+    def test_connected_members_are_skipped(self):
+        """Test users with an open chat socket get no push"""
+        presence.mark_connected(self.group.id, self.friend.id, 'chat.1')
+
+        notify_chat_message(self.group.id, self.sender.id, 'Leg day?')
+        dispatch_events()
+
+        self.assertFalse(self.pushes().exists())
+
+    @override_settings(NOTIFICATION_SKIP_ONLINE=False)
+    def test_connected_members_notified_without_shared_presence(self):
+        """Test presence is ignored unless skipping online users is on"""
+        presence.mark_connected(self.group.id, self.friend.id, 'chat.1')
+
+        notify_chat_message(self.group.id, self.sender.id, 'Leg day?')
+        dispatch_events()
+
+        self.assertEqual(self.pushes().get().user, self.friend)
+
+    def test_burst_in_one_batch_is_coalesced(self):
+        """Test a burst processed together yields a single push"""
+        for i in range(3):
+            notify_chat_message(self.group.id, self.sender.id, f'msg {i}')
+
+        dispatch_events()
+
+        push = self.pushes().get()
+        self.assertEqual(push.coalesced, 3)
+        self.assertEqual(push.message, '3 new messages in Gym')
+
+    def test_burst_after_leading_push_is_coalesced(self):
+        """Test events after the first push merge into one summary"""
+        notify_chat_message(self.group.id, self.sender.id, 'first')
+        dispatch_events()
+        leading = self.pushes().get()
+
+        for i in range(2):
+            notify_chat_message(self.group.id, self.sender.id, f'msg {i}')
+            dispatch_events()
+
+        leading_push, summary = self.pushes()
+        self.assertEqual(leading_push.pk, leading.pk)
+        self.assertEqual(summary.coalesced, 2)
+        self.assertEqual(summary.message, '2 new messages in Gym')
+        self.assertEqual(summary.next_attempt_at,
+                         leading.created_at + timedelta(seconds=60))
+
+    def test_comment_notifies_workout_owner(self):
+        """Test the workout owner is notified about comments"""
+        workout = Workout.objects.create(user=self.friend, title='Legs',
+                                         date=date.today())
+
+        notify_comment(workout.id, self.sender.id, 'Strong!')
+        notify_comment(workout.id, self.friend.id, 'Thanks')
+        dispatch_events()
+
+        push = self.pushes().get()
+        self.assertEqual(push.user, self.friend)
+        self.assertEqual(push.message, 'Sender commented on Legs: Strong!')
+
+    def test_users_without_devices_are_skipped(self):
+        """Test no push is queued for users without an enabled device"""
+        Device.objects.filter(user=self.friend).update(enabled=False)
+
+        notify_chat_message(self.group.id, self.sender.id, 'Leg day?')
+        dispatch_events()
+
+        self.assertFalse(self.pushes().exists())
+
+
+class PresenceCacheCheckTests(SimpleTestCase):
+    """Test the check for presence shared with the push worker."""
+
+    @override_settings(NOTIFICATION_SKIP_ONLINE=True)
+    def test_process_local_cache_is_an_error(self):
+        """Test skipping online users needs a shared cache"""
+        errors = check_presence_cache(None)
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], Error)
+        self.assertEqual(errors[0].id, 'core.E001')
+
+    @override_settings(NOTIFICATION_SKIP_ONLINE=True, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/0',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_presence_cache(None), [])
+
+    @override_settings(NOTIFICATION_SKIP_ONLINE=False)
+    def test_disabled_passes(self):
+        self.assertEqual(check_presence_cache(None), [])
@@ -0,0 +1,198 @@
+"""
+Tests for the push notification outbox
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import aws_sns
+from core.models import Device, PushOutbox
+from core.push import (
+    enqueue_registration,
+    enqueue_push,
+    process_batch,
+    purge_outbox,
+    register_device,
+)
+
+
+class FailingSNSClient(aws_sns.FakeSNSClient):
+    """Fake client whose publishes always fail."""
+
+    def publish(self, **kwargs):
+        raise RuntimeError('SNS unavailable')
+
+
+class DisabledEndpointError(Exception):
+    """Mimics botocore's ClientError for a disabled endpoint."""
+    response = {'Error': {'Code': 'EndpointDisabled'}}
+
+
+class DisabledSNSClient(aws_sns.FakeSNSClient):
+    """Fake client whose endpoints are all disabled."""
+
+    def publish(self, **kwargs):
+        raise DisabledEndpointError('Endpoint is disabled')
+
+
+class PushOutboxTests(TestCase):
+    """Test queueing and delivering push work."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+        self.client_patcher = patch('core.aws_sns.sns_client',
+                                    aws_sns.FakeSNSClient())
+        self.sns = self.client_patcher.start()
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+    def test_registration_deduped_per_device_token(self):
+        """Test a pending device token is only queued once"""
+        enqueue_registration(self.user, 'device-1')
+        enqueue_registration(self.user, 'device-1')
+        enqueue_registration(self.user, 'device-2')
+
+        self.assertEqual(PushOutbox.objects.count(), 2)
+
+    def test_process_registration(self):
+        """Test the worker registers and subscribes the device"""
+        enqueue_registration(self.user, 'device-1')
+
+        self.assertEqual(process_batch(), 1)
+
+        entry = PushOutbox.objects.get()
+        self.assertEqual(entry.status, PushOutbox.STATUS_SENT)
+        self.assertTrue(entry.endpoint_arn)
+        self.assertEqual([call[0] for call in self.sns.calls],
+                         ['create_platform_endpoint', 'subscribe'])
+
+    def test_process_publishes_in_batches(self):
+        """Test due pushes are delivered and only due ones"""
+        for i in range(5):
+            enqueue_push(f'arn:fake:{i}', 'hello')
+        later = enqueue_push('arn:fake:later', 'hello')
+        later.next_attempt_at = timezone.now() + timedelta(hours=1)
+        later.save()
+
+        self.assertEqual(process_batch(batch_size=3), 3)
+        self.assertEqual(process_batch(batch_size=3), 2)
+        self.assertEqual(process_batch(batch_size=3), 0)
+
+        self.assertEqual(len(self.sns.calls), 5)
+        self.assertEqual(PushOutbox.objects.filter(
+            status=PushOutbox.STATUS_SENT).count(), 5)
+
+    @override_settings(PUSH_OUTBOX_MAX_ATTEMPTS=2,
+                       PUSH_OUTBOX_BACKOFF_SECONDS=10)
+    def test_failed_publish_retries_with_backoff(self):
+        """Test failures are rescheduled and eventually given up"""
+        entry = enqueue_push('arn:fake:1', 'hello')
+        with patch('core.aws_sns.sns_client', FailingSNSClient()):
+            before = timezone.now()
+            process_batch()
+            entry.refresh_from_db()
+            self.assertEqual(entry.status, PushOutbox.STATUS_PENDING)
+            self.assertEqual(entry.attempts, 1)
+            self.assertEqual(entry.last_error, 'SNS unavailable')
+            self.assertGreaterEqual(entry.next_attempt_at,
+                                    before + timedelta(seconds=10))
+
+            PushOutbox.objects.filter(pk=entry.pk).update(
+                next_attempt_at=timezone.now())
+            process_batch()
+            entry.refresh_from_db()
+            self.assertEqual(entry.status, PushOutbox.STATUS_FAILED)
+            self.assertEqual(entry.attempts, 2)
+
+    def test_process_registration_saves_device(self):
+        """Test a registered token is stored as a device"""
+        enqueue_registration(self.user, 'device-1')
+        process_batch()
+
+        device = Device.objects.get(device_token='device-1')
+        self.assertEqual(device.user, self.user)
+        self.assertTrue(device.endpoint_arn.startswith('arn:fake'))
+        self.assertTrue(device.subscription_arn)
+        self.assertTrue(device.enabled)
+
+    def test_disabled_endpoint_disables_device(self):
+        """Test a disabled endpoint fails fast and flags the device"""
+        Device.objects.create(user=self.user, device_token='device-1',
+                              endpoint_arn='arn:fake:1')
+        entry = enqueue_push('arn:fake:1', 'hello')
+
+        with patch('core.aws_sns.sns_client', DisabledSNSClient()):
+            process_batch()
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, PushOutbox.STATUS_FAILED)
+        self.assertFalse(Device.objects.get().enabled)
+
+    @override_settings(PUSH_OUTBOX_RETENTION_DAYS=7)
+    def test_purge_deletes_old_finished_entries(self):
+        """Test only sent and failed entries past retention are purged"""
+        old = timezone.now() - timedelta(days=8)
+        for status in [PushOutbox.STATUS_SENT, PushOutbox.STATUS_FAILED,
+                       PushOutbox.STATUS_SENT]:
+            PushOutbox.objects.create(kind=PushOutbox.KIND_PUBLISH,
+                                      status=status, next_attempt_at=old)
+        pending = PushOutbox.objects.create(
+            kind=PushOutbox.KIND_PUBLISH, next_attempt_at=old)
+        recent = PushOutbox.objects.create(
+            kind=PushOutbox.KIND_PUBLISH, status=PushOutbox.STATUS_SENT)
+
+        self.assertEqual(purge_outbox(batch_size=2), 3)
+
+        self.assertEqual(set(PushOutbox.objects.values_list('id', flat=True)),
+                         {pending.id, recent.id})
+
+
+class RegisterDeviceTests(TestCase):
+    """Test login-time device registration."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123')
+
+    def test_new_device_is_queued(self):
+        """Test an unknown token is queued for registration"""
+        register_device(self.user, 'device-1')
+
+        self.assertTrue(PushOutbox.objects.filter(
+            device_token='device-1').exists())
+
+    def test_known_device_skips_sns(self):
+        """Test a registered, enabled device is not registered again"""
+        Device.objects.create(user=self.user, device_token='device-1',
+                              endpoint_arn='arn:fake:1')
+
+        with self.assertNumQueries(1):
+            register_device(self.user, 'device-1')
+
+        self.assertFalse(PushOutbox.objects.exists())
+
+    def test_disabled_device_is_queued(self):
+        """Test a disabled device is registered again"""
+        Device.objects.create(user=self.user, device_token='device-1',
+                              endpoint_arn='arn:fake:1', enabled=False)
+
+        register_device(self.user, 'device-1')
+
+        self.assertTrue(PushOutbox.objects.exists())
+
+    def test_device_moved_to_other_user_is_relinked(self):
+        """Test a known device logging into another account is relinked"""
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123')
+        Device.objects.create(user=other, device_token='device-1',
+                              endpoint_arn='arn:fake:1')
+
+        register_device(self.user, 'device-1')
+
+        self.assertEqual(Device.objects.get().user, self.user)
+        self.assertFalse(PushOutbox.objects.exists())
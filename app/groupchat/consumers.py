@@ -1,12 +1,36 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
-import json
+import asyncio
+import logging
+import time
 from core.models import Group, Message
 from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from core import presence
+from core.notifications import notify_chat_message
+from groupchat.encoding import (
+    MSGPACK_SUBPROTOCOL,
+    binary_frame,
+    decode_frame,
+    encode_frames,
+)
+from groupchat.limits import connection_bucket, group_bucket
+from groupchat.presence import debouncer
+from groupchat.receipts import read_markers
 
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Close codes, see RFC 6455 section 7.4
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+MESSAGE_MAX_LENGTH = Message._meta.get_field('content').max_length
 
 
 class GroupChatConsumer(AsyncWebsocketConsumer):
@@ -25,18 +49,72 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        # Mobile clients may ask for compact MessagePack frames
+        self.binary = MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(
+            subprotocol=MSGPACK_SUBPROTOCOL if self.binary else None)
+        self.user_id = self.scope['user'].id
+        self.last_heartbeat = time.monotonic()
+        self.last_typing = None
+        self.last_read = 0
+        # Highest message seq this socket knows to exist
+        self.latest_seq = 0
+        self.bucket = connection_bucket()
+        # Frames wait here for the writer task; a full queue means the
+        # client is not keeping up
+        self.outbox = asyncio.Queue(maxsize=settings.CHAT_SEND_QUEUE_SIZE)
+        self.writer = asyncio.ensure_future(self.write_frames())
+        self.closing = False
+        await self.update_presence(
+            presence.mark_connected, self.user_id, self.channel_name)
 
     async def disconnect(self, close_code):
+        if getattr(self, 'writer', None) is not None:
+            self.writer.cancel()
+        if getattr(self, 'user_id', None) is not None:
+            await self.update_presence(
+                presence.mark_disconnected, self.user_id, self.channel_name)
+
         # Remove the connection from the group room
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        data = json.loads(text_data)
-        message_content = data['content']
+    async def receive(self, text_data=None, bytes_data=None):
+        if self.frame_too_big(text_data, bytes_data):
+            await self.close(code=CLOSE_MESSAGE_TOO_BIG)
+            return
+        if not self.bucket.consume():
+            await self.send_error('rate_limited')
+            return
+
+        try:
+            data = decode_frame(text_data, bytes_data)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            await self.send_error('invalid_message')
+            return
+        if data.get('type') == 'heartbeat':
+            await self.heartbeat()
+            return
+        if data.get('type') == 'typing':
+            await self.typing()
+            return
+        if data.get('type') == 'read':
+            await self.read(data.get('seq'))
+            return
+
+        message_content = data.get('content')
+        if (not isinstance(message_content, str)
+                or len(message_content) > MESSAGE_MAX_LENGTH):
+            await self.send_error('invalid_message')
+            return
+        if not group_bucket(self.group_id).consume():
+            await self.send_error('rate_limited')
+            return
+
         user = self.scope['user']
         sender_id = user.id
 
@@ -47,37 +125,174 @@ class GroupChatConsumer(AsyncWebsocketConsumer):
             return  # Do not process message if sender is not a member
 
         # Save the message to the database
-        await self.save_message(
+        message = await self.save_message(
             sender_id,
             self.group_id, message_content)
 
-        # Broadcast the message to the group
+        if message is None:
+            await self.send_error('save_failed')
+            return
+
+        # Broadcast the message to the group, encoded once for all sockets
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
-                'message': message_content,
-                'sender_id': sender_id,
-                'sender_name': user.name
+                'seq': message.seq,
+                **encode_frames({
+                    'id': message.id,
+                    'seq': message.seq,
+                    'content': message_content,
+                    'sender_id': sender_id,
+                    'sender_name': user.name
+                }),
+            }
+        )
+
+    @staticmethod
+    def frame_too_big(text_data, bytes_data):
+        limit = settings.CHAT_MAX_FRAME_BYTES
+        if bytes_data is not None:
+            return len(bytes_data) > limit
+        # Every character takes at least one byte, skip encoding when
+        # the length alone is over the limit
+        return (len(text_data) > limit
+                or len(text_data.encode()) > limit)
+
+    async def send_error(self, reason):
+        await self.send_frames(
+            encode_frames({'type': 'error', 'reason': reason}),
+            droppable=True)
+
+    async def heartbeat(self):
+        """Refresh presence, at most once per heartbeat interval."""
+        now = time.monotonic()
+        if now - self.last_heartbeat < settings.PRESENCE_HEARTBEAT_INTERVAL:
+            return
+        self.last_heartbeat = now
+        await self.update_presence(
+            presence.heartbeat, self.user_id, self.channel_name)
+
+    async def update_presence(self, update, *args):
+        """Apply a presence update and queue the resulting changes,
+        including users whose connections expired, for broadcast.
+
+        Updates run in the thread pool rather than on the thread shared
+        with database_sync_to_async, as they only talk to the cache."""
+        online, offline = await sync_to_async(
+            update, thread_sensitive=False)(self.group_id, *args)
+        for user_id in online:
+            debouncer.record(self.channel_layer, self.group_id,
+                             user_id, online=True)
+        for user_id in offline:
+            debouncer.record(self.channel_layer, self.group_id,
+                             user_id, online=False)
+
+    async def typing(self):
+        """Tell the group the user is typing, at most once per
+        throttle window."""
+        now = time.monotonic()
+        if (self.last_typing is not None
+                and now - self.last_typing < settings.TYPING_THROTTLE_SECONDS):
+            return
+        self.last_typing = now
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'ephemeral_event',
+                'sender_channel': self.channel_name,
+                **encode_frames({
+                    'type': 'typing',
+                    'user_id': self.user_id,
+                    'sender_name': self.scope['user'].name,
+                }),
             }
         )
 
+    async def read(self, seq):
+        """Broadcast a read receipt and buffer the read marker.
+
+        Receipts that do not move the marker forward are dropped, and
+        receipts past the last message of the group are clamped to it."""
+        if (not isinstance(seq, int) or isinstance(seq, bool)
+                or seq <= self.last_read):
+            return
+        if seq > self.latest_seq:
+            self.latest_seq = await self.group_message_seq(self.group_id)
+            seq = min(seq, self.latest_seq)
+            if seq <= self.last_read:
+                return
+        self.last_read = seq
+        read_markers.record(self.user_id, self.group_id, seq)
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'ephemeral_event',
+                'sender_channel': self.channel_name,
+                **encode_frames({
+                    'type': 'read',
+                    'user_id': self.user_id,
+                    'seq': seq,
+                }),
+            }
+        )
+
+    async def send_frames(self, event, droppable=False):
+        """Queue a pre-encoded event in the negotiated framing.
+
+        When the queue is full, droppable frames are discarded and
+        anything else closes the connection of the slow client."""
+        if self.closing:
+            return
+        try:
+            self.outbox.put_nowait(
+                binary_frame(event['text']) if self.binary
+                else event['text'])
+        except asyncio.QueueFull:
+            if not droppable:
+                self.closing = True
+                await self.close(code=CLOSE_TRY_AGAIN_LATER)
+
+    async def write_frames(self):
+        while True:
+            frame = await self.outbox.get()
+            if isinstance(frame, bytes):
+                await self.send(bytes_data=frame)
+            else:
+                await self.send(text_data=frame)
+
+    async def presence_delta(self, event):
+        # Send the debounced presence changes to WebSocket
+        await self.send_frames(event, droppable=True)
+
+    async def ephemeral_event(self, event):
+        # Typing and read events are not echoed to their sender
+        if event['sender_channel'] != self.channel_name:
+            await self.send_frames(event, droppable=True)
+
     async def chat_message(self, event):
+        self.latest_seq = max(self.latest_seq, event.get('seq', 0))
         # Send the message to WebSocket
-        await self.send(text_data=json.dumps({
-            'content': event['message'],
-            'sender_id': event['sender_id'],
-            'sender_name': event['sender_name']
-        }))
+        await self.send_frames(event)
 
     @database_sync_to_async
     def save_message(self, sender_id, group_id, content):
         try:
-            group = Group.objects.get(id=group_id)
-            sender = User.objects.get(id=sender_id)
-            Message.objects.create(group=group, sender=sender, content=content)
-        except Exception as e:
-            print(e)
+            with transaction.atomic():
+                message = Message.objects.create(
+                    group_id=group_id, sender_id=sender_id, content=content)
+                # Push fan-out happens in the outbox worker
+                notify_chat_message(group_id, sender_id, content)
+            return message
+        except Exception:
+            logger.exception('Could not save message to group %s', group_id)
+            return None
+
+    @database_sync_to_async
+    def group_message_seq(self, group_id):
+        """Return the seq of the latest message of the group."""
+        return (Group.objects.filter(pk=group_id)
+                .values_list('message_seq', flat=True).first() or 0)
 
     @sync_to_async
     def is_member(self, group_id, user):
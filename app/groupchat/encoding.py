@@ -0,0 +1,43 @@
+"""
+Encoding of chat events sent to WebSocket clients.
+
+Broadcast events carry their JSON frame pre-encoded, so a message is
+serialized once per send instead of once per recipient socket. Clients
+negotiating the MessagePack subprotocol receive compact binary frames,
+which are only encoded by server processes that have such a socket,
+everyone else receives JSON text frames.
+"""
+import json
+from functools import lru_cache
+
+import msgpack
+
+MSGPACK_SUBPROTOCOL = 'jimbro.msgpack'
+
+
+def encode_frames(payload):
+    """Return the frames of a payload, to be merged into its event."""
+    return {'text': json.dumps(payload)}
+
+
+@lru_cache(maxsize=256)
+def binary_frame(text):
+    """Return the MessagePack frame of a JSON frame.
+
+    Every socket receives its own copy of a broadcast event, so frames
+    are remembered to encode a broadcast once per process rather than
+    once per MessagePack socket."""
+    return msgpack.packb(json.loads(text))
+
+
+def decode_frame(text_data=None, bytes_data=None):
+    """Decode an incoming JSON or MessagePack frame.
+
+    Raises ValueError if the frame is malformed."""
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data)
+    try:
+        return json.loads(text_data)
+    except RecursionError:
+        # The json module recurses once per level of nesting
+        raise ValueError('Frame is nested too deeply')
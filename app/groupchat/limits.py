@@ -0,0 +1,49 @@
+"""
+Rate limits for chat sockets.
+
+Buckets live in process memory: one per connection and one per group
+per server process, so a group's effective limit scales with the number
+of processes serving it.
+"""
+import time
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """Allow `rate` events per second with bursts of up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self, tokens=1):
+        """Take tokens from the bucket, returning False if it is empty."""
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+def connection_bucket():
+    return TokenBucket(settings.CHAT_RATE_PER_SECOND,
+                       settings.CHAT_RATE_BURST)
+
+
+_group_buckets = {}
+
+
+def group_bucket(group_id):
+    """Return the bucket shared by every socket of a group."""
+    bucket = _group_buckets.get(group_id)
+    if bucket is None:
+        bucket = _group_buckets[group_id] = TokenBucket(
+            settings.CHAT_GROUP_RATE_PER_SECOND,
+            settings.CHAT_GROUP_RATE_BURST)
+    return bucket
@@ -0,0 +1,127 @@
+"""
+Django command measuring the cost of broadcasting a chat message through
+the channel layer
+"""
+import asyncio
+import json
+import statistics
+import time
+
+import msgpack
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+
+from core.models import Group, User
+from groupchat.consumers import GroupChatConsumer
+from groupchat.encoding import MSGPACK_SUBPROTOCOL, encode_frames
+
+EMAIL_PREFIX = 'benchmark-fanout-'
+
+PAYLOAD = {
+    'content': 'Leg day done, 5x5 squats at 120kg. Who is in tomorrow?',
+    'sender_id': 42,
+    'sender_name': 'Jim Bro',
+}
+
+
+async def _connect(group, users, binary_share):
+    """Open a chat socket for every user, the first `binary_share` of
+    them negotiating MessagePack."""
+    binary = round(len(users) * binary_share)
+    communicators = []
+    for i, user in enumerate(users):
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(), f'/ws/chat/{group.id}/',
+            subprotocols=[MSGPACK_SUBPROTOCOL] if i < binary else None)
+        communicator.scope['url_route'] = {'kwargs': {'group_id': group.id}}
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError('A benchmark socket was refused.')
+        communicators.append(communicator)
+    return communicators
+
+
+async def _receive_message(communicator, seq):
+    """Wait for the chat message `seq`, skipping presence deltas."""
+    while True:
+        output = await communicator.receive_output(timeout=10)
+        frame = output.get('text') or msgpack.unpackb(output['bytes'])
+        if isinstance(frame, str):
+            frame = json.loads(frame)
+        if frame.get('seq') == seq:
+            return
+
+
+async def _broadcast(group, users, messages, binary_share):
+    """Send `messages` broadcasts to the sockets of `users` the way the
+    consumer does, one at a time. Returns the latency of each until
+    every socket has written it and the CPU time of all of them."""
+    communicators = await _connect(group, users, binary_share)
+    layer = get_channel_layer()
+    latencies = []
+    cpu = time.process_time()
+    try:
+        for seq in range(1, messages + 1):
+            start = time.perf_counter()
+            await layer.group_send(f'group_{group.id}', {
+                'type': 'chat_message',
+                'seq': seq,
+                **encode_frames({'seq': seq, **PAYLOAD}),
+            })
+            await asyncio.gather(*(_receive_message(communicator, seq)
+                                   for communicator in communicators))
+            latencies.append(time.perf_counter() - start)
+        cpu = time.process_time() - cpu
+    finally:
+        for communicator in communicators:
+            await communicator.disconnect()
+    return latencies, cpu
+
+
+class Command(BaseCommand):
+    """Broadcast chat messages through the configured channel layer to
+    a group of connected consumers, once with JSON sockets only and once
+    with a share of MessagePack sockets; the benchmark group and users
+    are deleted afterwards"""
+
+    help = 'Benchmark chat message fan-out through the channel layer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=100)
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument(
+            '--binary-share', type=float, default=0.5,
+            help='Share of sockets using MessagePack in the second run.')
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        users = User.objects.bulk_create([
+            User(email=f'{EMAIL_PREFIX}{i}@example.com', name=f'Member {i}')
+            for i in range(options['members'])])
+        group = Group.objects.create(name='Benchmark fan-out')
+        group.members.add(*users)
+        self.stdout.write(
+            f"layer={get_channel_layer().__class__.__name__} "
+            f"members={options['members']}")
+        try:
+            for name, share in (('json', 0.0),
+                                ('mixed', options['binary_share'])):
+                latencies, cpu = asyncio.run(_broadcast(
+                    group, users, options['messages'], share))
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                self.stdout.write(
+                    f"{name:<6} "
+                    f"throughput={len(latencies) / sum(latencies):.0f} msg/s "
+                    f"p50={statistics.median(latencies) * 1000:.1f}ms "
+                    f"p95={p95 * 1000:.1f}ms "
+                    f"cpu/message={cpu / len(latencies) * 1000:.2f}ms")
+        finally:
+            group.delete()
+            User.objects.filter(email__startswith=EMAIL_PREFIX).delete()
+
+        text = encode_frames(PAYLOAD)['text']
+        self.stdout.write(
+            f"frame size json={len(text.encode())}B "
+            f"msgpack={len(msgpack.packb(PAYLOAD))}B")
@@ -0,0 +1,117 @@
+"""
+Django command measuring how the fan-out of one large chat room scales
+with the number of socket worker processes
+"""
+import asyncio
+import multiprocessing
+import time
+import uuid
+
+from channels.layers import (
+    DEFAULT_CHANNEL_LAYER,
+    InMemoryChannelLayer,
+    channel_layers,
+)
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from groupchat.encoding import encode_frames
+
+PAYLOAD = {
+    'content': 'Leg day done, 5x5 squats at 120kg. Who is in tomorrow?',
+    'sender_id': 42,
+    'sender_name': 'Jim Bro',
+}
+
+
+async def _serve(group, sockets, messages, ready, results):
+    """Hold `sockets` channels of the room, like one socket worker, and
+    report when each has received `messages` broadcasts."""
+    layer = channel_layers.make_backend(DEFAULT_CHANNEL_LAYER)
+    channels = [await layer.new_channel() for _ in range(sockets)]
+    for channel in channels:
+        await layer.group_add(group, channel)
+    await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+
+    async def receive(channel):
+        for _ in range(messages):
+            event = await layer.receive(channel)
+            # What the consumer hands a JSON socket
+            event['text']
+
+    cpu = time.process_time()
+    await asyncio.gather(*(receive(channel) for channel in channels))
+    results.put(time.process_time() - cpu)
+    for channel in channels:
+        await layer.group_discard(group, channel)
+
+
+def _worker(*args):
+    asyncio.run(_serve(*args))
+
+
+async def _broadcast(group, messages):
+    layer = channel_layers.make_backend(DEFAULT_CHANNEL_LAYER)
+    for seq in range(1, messages + 1):
+        await layer.group_send(group, {
+            'type': 'chat_message',
+            'seq': seq,
+            **encode_frames({'seq': seq, **PAYLOAD}),
+        })
+
+
+class Command(BaseCommand):
+    """Split the sockets of one room over 1..N worker processes that
+    receive its broadcasts through the channel layer, and time until
+    every socket got every message"""
+
+    help = 'Benchmark fan-out of one large room across socket workers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=20)
+        parser.add_argument(
+            '--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+            help='Worker process counts to compare.')
+
+    def handle(self, *args, **options):
+        """Entry point for the command"""
+        if isinstance(channel_layers[DEFAULT_CHANNEL_LAYER],
+                      InMemoryChannelLayer):
+            raise CommandError(
+                'Worker processes cannot share the in-memory channel '
+                'layer. Set CHAT_REDIS_HOSTS or REDIS_URL.')
+        self.stdout.write(f"hosts={len(settings.CHAT_REDIS_HOSTS)} "
+                          f"members={options['members']} "
+                          f"messages={options['messages']}")
+
+        context = multiprocessing.get_context('spawn')
+        for workers in options['workers']:
+            group = f'benchmark_shards_{uuid.uuid4().hex}'
+            ready = context.Barrier(workers + 1)
+            results = context.Queue()
+            share, rest = divmod(options['members'], workers)
+            sockets = [share + (i < rest) for i in range(workers)]
+            processes = [
+                context.Process(target=_worker, args=(
+                    group, count, options['messages'], ready, results))
+                for count in sockets]
+            for process in processes:
+                process.start()
+            try:
+                ready.wait(timeout=120)
+                start = time.perf_counter()
+                asyncio.run(_broadcast(group, options['messages']))
+                cpu = [results.get(timeout=300) for _ in processes]
+                elapsed = time.perf_counter() - start
+            finally:
+                for process in processes:
+                    process.join(timeout=10)
+                    process.terminate()
+
+            deliveries = options['members'] * options['messages']
+            self.stdout.write(
+                f"workers={workers:<3} "
+                f"throughput={deliveries / elapsed:.0f} deliveries/s "
+                f"per-message={elapsed / options['messages'] * 1000:.1f}ms "
+                f"max-worker-cpu={max(cpu) * 1000:.0f}ms")
@@ -0,0 +1,53 @@
+"""
+Debounced presence broadcasts for group chat sockets.
+"""
+import asyncio
+
+from django.conf import settings
+
+from groupchat.encoding import encode_frames
+
+
+def room_group_name(group_id):
+    return f'group_{group_id}'
+
+
+class PresenceDebouncer:
+    """Collect presence changes per group and broadcast them as one
+    `presence_delta` event per debounce window.
+
+    Only transitions are recorded (first socket opened, last socket
+    closed), so reconnect storms and heartbeats never reach the channel
+    layer."""
+
+    def __init__(self):
+        self._pending = {}
+        self._flushes = {}
+
+    def record(self, channel_layer, group_id, user_id, online):
+        self._pending.setdefault(group_id, {})[user_id] = online
+        flush = self._flushes.get(group_id)
+        if (flush is None or flush.done()
+                or flush.get_loop() is not asyncio.get_running_loop()):
+            self._flushes[group_id] = asyncio.ensure_future(
+                self._flush_later(channel_layer, group_id))
+
+    async def _flush_later(self, channel_layer, group_id):
+        await asyncio.sleep(settings.PRESENCE_DEBOUNCE_SECONDS)
+        self._flushes.pop(group_id, None)
+        changes = self._pending.pop(group_id, {})
+        if not changes:
+            return
+        await channel_layer.group_send(room_group_name(group_id), {
+            'type': 'presence_delta',
+            **encode_frames({
+                'type': 'presence',
+                'online': sorted(
+                    u for u, online in changes.items() if online),
+                'offline': sorted(
+                    u for u, online in changes.items() if not online),
+            }),
+        })
+
+
+debouncer = PresenceDebouncer()
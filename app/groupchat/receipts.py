@@ -0,0 +1,73 @@
+"""
+Batched persistence of chat read markers.
+
+Read receipts are broadcast to the group right away, but the markers
+themselves are buffered in process and written in one upsert per flush
+window, so a burst of receipts costs a single round trip.
+"""
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from core.models import ReadMarker
+
+logger = logging.getLogger(__name__)
+
+
+def save_read_markers(markers):
+    """Upsert `{(user_id, group_id): seq}` without moving any marker
+    backwards."""
+    if not markers:
+        return
+    user_ids = {user_id for user_id, _ in markers}
+    group_ids = {group_id for _, group_id in markers}
+    for user_id, group_id, last_read in (
+            ReadMarker.objects
+            .filter(user_id__in=user_ids, group_id__in=group_ids)
+            .values_list('user_id', 'group_id', 'last_read_seq')):
+        key = (user_id, group_id)
+        if key in markers:
+            markers[key] = max(markers[key], last_read)
+
+    ReadMarker.objects.bulk_create(
+        [ReadMarker(user_id=user_id, group_id=group_id,
+                    last_read_seq=seq)
+         for (user_id, group_id), seq in markers.items()],
+        update_conflicts=True,
+        unique_fields=['user', 'group'],
+        update_fields=['last_read_seq', 'updated_at'])
+
+
+class ReadMarkerBuffer:
+    """Keep the highest read sequence per (user, group) and flush all
+    buffered markers once per READ_MARKER_FLUSH_SECONDS."""
+
+    def __init__(self):
+        self._pending = {}
+        self._flush = None
+
+    def record(self, user_id, group_id, seq):
+        key = (user_id, group_id)
+        self._pending[key] = max(self._pending.get(key, 0), seq)
+        flush = self._flush
+        if (flush is None or flush.done()
+                or flush.get_loop() is not asyncio.get_running_loop()):
+            self._flush = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.READ_MARKER_FLUSH_SECONDS)
+        await self.flush()
+
+    async def flush(self):
+        """Save the buffered markers. A batch that fails is logged and
+        dropped; later receipts are buffered and flushed as usual."""
+        markers, self._pending = self._pending, {}
+        try:
+            await database_sync_to_async(save_read_markers)(markers)
+        except Exception:
+            logger.exception('Could not save %d read markers', len(markers))
+
+
+read_markers = ReadMarkerBuffer()
@@ -1,14 +1,26 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+import msgpack
 from asgiref.sync import sync_to_async
-from core.models import Group, Message
+from core.models import Group, Message, NotificationEvent, ReadMarker
 from groupchat.consumers import GroupChatConsumer
+from groupchat.encoding import MSGPACK_SUBPROTOCOL
 from rest_framework.test import APIClient
 from rest_framework import status
 
 User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
 
 
 def create_user(**params):
@@ -21,8 +33,11 @@ def create_group(**params):
     return Group.objects.create(**params)
 
 
-class GroupChatConsumerTestCase(TestCase):
-    """Test case for GroupChatConsumer."""
+class GroupChatConsumerTestCase(TransactionTestCase):
+    """Test case for GroupChatConsumer.
+
+    The consumer closes its database connection after each query, so the
+    tests cannot run inside a TestCase transaction."""
 
     def setUp(self):
         """Set up the test case environment."""
@@ -80,6 +95,125 @@ class GroupChatConsumerTestCase(TestCase):
         response = await communicator.receive_json_from()
         self.assertEqual(response['content'], 'Hello, World!')
         self.assertEqual(response['sender_id'], self.user.id)
+        self.assertTrue(await sync_to_async(
+            NotificationEvent.objects.filter(group=self.group).exists)())
+
+        await communicator.disconnect()
+
+    async def test_messages_are_numbered_in_the_database(self):
+        """Test sent messages are saved with consecutive seqs."""
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/"
+        )
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = self.user
+        await communicator.connect()
+
+        for content in ('First', 'Second'):
+            await communicator.send_json_to({'content': content})
+        frames = [await communicator.receive_json_from() for _ in range(2)]
+
+        saved = await sync_to_async(list)(
+            Message.objects.filter(group=self.group)
+            .order_by('seq').values_list('seq', 'content'))
+        self.assertEqual(saved, [(1, 'First'), (2, 'Second')])
+        self.assertEqual([frame['seq'] for frame in frames], [1, 2])
+        await sync_to_async(self.group.refresh_from_db)()
+        self.assertEqual(self.group.message_seq, 2)
+
+        await communicator.disconnect()
+
+    async def test_failed_save_is_reported(self):
+        """Test a message that cannot be saved is not broadcast and the
+        sender gets an error."""
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/"
+        )
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = self.user
+        await communicator.connect()
+
+        with patch('groupchat.consumers.notify_chat_message',
+                   side_effect=DatabaseError('down')), \
+                self.assertLogs('groupchat.consumers', 'ERROR'):
+            await communicator.send_json_to({'content': 'Lost'})
+            response = await communicator.receive_json_from()
+
+        self.assertEqual(response, {'type': 'error',
+                                    'reason': 'save_failed'})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        self.assertFalse(await sync_to_async(
+            Message.objects.filter(group=self.group).exists)())
+
+        await communicator.disconnect()
+
+    async def test_message_reaches_every_socket(self):
+        """Test a message is broadcast to all sockets of the room."""
+        communicators = []
+        for _ in range(3):
+            communicator = WebsocketCommunicator(
+                GroupChatConsumer.as_asgi(),
+                f"/ws/chat/{self.group.id}/"
+            )
+            communicator.scope['url_route'] = {
+                'kwargs': {'group_id': self.group.id}}
+            communicator.scope['user'] = self.user
+            await communicator.connect()
+            communicators.append(communicator)
+
+        await communicators[0].send_json_to({'content': 'Hello, room!'})
+
+        for communicator in communicators:
+            response = await communicator.receive_json_from(timeout=1)
+            self.assertEqual(response['content'], 'Hello, room!')
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    async def test_json_sockets_skip_msgpack_encoding(self):
+        """Test broadcasts are only encoded as MessagePack for sockets
+        that negotiated it."""
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/"
+        )
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = self.user
+        await communicator.connect()
+
+        with patch('groupchat.encoding.msgpack.packb') as packb:
+            await communicator.send_json_to({'content': 'Hello, room!'})
+            response = await communicator.receive_json_from(timeout=1)
+
+        self.assertEqual(response['content'], 'Hello, room!')
+        packb.assert_not_called()
+        await communicator.disconnect()
+
+    async def test_msgpack_subprotocol(self):
+        """Test clients negotiating MessagePack get binary frames."""
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/",
+            subprotocols=[MSGPACK_SUBPROTOCOL]
+        )
+
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = self.user
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, MSGPACK_SUBPROTOCOL)
+
+        await communicator.send_to(
+            bytes_data=msgpack.packb({'content': 'Hello, binary!'}))
+
+        response = msgpack.unpackb(await communicator.receive_from())
+        self.assertEqual(response['content'], 'Hello, binary!')
+        self.assertEqual(response['sender_id'], self.user.id)
 
         await communicator.disconnect()
 
@@ -134,6 +268,20 @@ class GroupMessagesViewTestCase(TestCase):
         self.assertEqual(len(response.data['data']), 1)
         self.assertEqual(response.data['data'][0]['content'], message.content)
 
+    def test_messages_are_numbered_per_group(self):
+        """Test each group numbers its messages from one."""
+        other_group = Group.objects.create(name='Other Group')
+        first = Message.objects.create(
+            group=self.group, sender=self.user, content='First')
+        other = Message.objects.create(
+            group=other_group, sender=self.user, content='Other')
+        second = Message.objects.create(
+            group=self.group, sender=self.user, content='Second')
+
+        self.assertEqual((first.seq, second.seq, other.seq), (1, 2, 1))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.message_seq, 2)
+
     def test_get_group_messages_not_a_member(self):
         """""""Test retrieving group messages when user is not a member."""""""
         other_user = User.objects.create_user(
@@ -148,6 +296,100 @@ class GroupMessagesViewTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GroupMessageArchiveViewTestCase(TestCase):
+    """Test case for GroupMessageArchiveView API."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email='user@example.com', password='testpassword',
+            name='Test User')
+        self.group = Group.objects.create(name='Test Group')
+        self.group.members.add(self.user)
+        self.client.force_authenticate(user=self.user)
+        self.old = timezone.now() - timedelta(days=400)
+        for content in ('First', 'Second'):
+            message = Message.objects.create(
+                group=self.group, sender=self.user, content=content)
+            Message.objects.filter(id=message.id).update(timestamp=self.old)
+        call_command('archive_messages', stdout=StringIO())
+        self.url = reverse('group_message_archive',
+                           kwargs={'group_id': self.group.id})
+
+    def test_list_archives(self):
+        """Test listing the archived months of a group."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [{
+            'month': f'{timezone.localdate(self.old):%Y-%m}',
+            'first_seq': 1,
+            'last_seq': 2,
+            'message_count': 2,
+        }])
+
+    def test_get_archived_month(self):
+        """Test retrieving the messages of an archived month."""
+        month = f'{timezone.localdate(self.old):%Y-%m}'
+        response = self.client.get(self.url, {'month': month})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(m['seq'], m['content'], m['sender_name'])
+             for m in response.data['data']],
+            [(2, 'Second', 'Test User'), (1, 'First', 'Test User')])
+
+    def test_archived_month_is_paginated(self):
+        """Test archived messages are served a page at a time."""
+        month = f'{timezone.localdate(self.old):%Y-%m}'
+        response = self.client.get(self.url, {'month': month,
+                                              'page_size': 1})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([m['content'] for m in response.data['data']],
+                         ['Second'])
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual([m['content'] for m in response.data['data']],
+                         ['First'])
+        self.assertIsNone(response.data['next'])
+
+    def test_fully_archived_group_points_to_archive(self):
+        """Test a member of a group without recent messages gets an
+        empty page linking to the archives."""
+        url = reverse('group_messages', kwargs={'group_id': self.group.id})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data'], [])
+        self.assertEqual(response.data['archive'],
+                         'http://testserver' + self.url)
+
+    def test_invalid_month(self):
+        """Test a malformed month is rejected."""
+        response = self.client.get(self.url, {'month': 'last-year'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_archive_not_a_member(self):
+        """Test archives are only readable by group members."""
+        other_user = User.objects.create_user(
+            email='other_user@example.com', password='testpassword')
+        self.client.force_authenticate(user=other_user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class GroupListViewTestCase(TestCase):
     """Test case for GroupListView API."""
 
@@ -172,6 +414,31 @@ class GroupListViewTestCase(TestCase):
         self.assertEqual(response.data['data'][0]['name'], 'Test Group')
         self.assertEqual(response.data['data'][0]['invite_code'], 'ABC123')
 
+    def test_get_user_groups_unread_and_last_message(self):
+        """Test groups carry an unread count and last message preview."""
+        friend = User.objects.create_user(
+            email='friend@example.com', password='testpassword',
+            name='Friend')
+        for content in ('One', 'Two', 'Three'):
+            Message.objects.create(
+                group=self.group, sender=friend, content=content)
+        ReadMarker.objects.create(
+            user=self.user, group=self.group, last_read_seq=1)
+        Group.objects.create(name='Empty Group').members.add(self.user)
+
+        url = reverse('user_chatrooms')
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+
+        groups = {group['name']: group for group in response.data['data']}
+        self.assertEqual(groups['Test Group']['unread_count'], 2)
+        last_message = groups['Test Group']['last_message']
+        self.assertEqual(last_message['content'], 'Three')
+        self.assertEqual(last_message['sender_name'], 'Friend')
+        self.assertEqual(last_message['seq'], 3)
+        self.assertEqual(groups['Empty Group']['unread_count'], 0)
+        self.assertIsNone(groups['Empty Group']['last_message'])
+
     def test_get_user_groups_not_a_member(self):
         """""""Test retrieving groups when user is not a member."""""""
         other_user = User.objects.create_user(
@@ -0,0 +1,138 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import msgpack
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from core.models import Group
+from groupchat.consumers import GroupChatConsumer
+from groupchat.encoding import encode_frames
+from groupchat.limits import TokenBucket
+
+User = get_user_model()
+
+
+class TokenBucketTestCase(SimpleTestCase):
+    """Test case for the token bucket."""
+
+    @patch('groupchat.limits.time.monotonic')
+    def test_bucket_refills_over_time(self, monotonic):
+        """Test a bucket allows a burst and then refills at its rate."""
+        monotonic.return_value = 100.0
+        bucket = TokenBucket(rate=2, burst=2)
+
+        self.assertTrue(bucket.consume())
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+        monotonic.return_value = 100.5
+        self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+
+
+class SendQueueTestCase(SimpleTestCase):
+    """Test case for backpressure on the outgoing frame queue."""
+
+    def make_consumer(self):
+        consumer = GroupChatConsumer()
+        consumer.binary = False
+        consumer.closing = False
+        consumer.outbox = asyncio.Queue(maxsize=1)
+        consumer.close = AsyncMock()
+        return consumer
+
+    async def test_full_queue_drops_ephemeral_frames(self):
+        """Test ephemeral frames are dropped for a slow client."""
+        consumer = self.make_consumer()
+        frames = encode_frames({'type': 'typing'})
+
+        await consumer.send_frames(frames, droppable=True)
+        await consumer.send_frames(frames, droppable=True)
+
+        self.assertEqual(consumer.outbox.qsize(), 1)
+        consumer.close.assert_not_called()
+
+    async def test_full_queue_closes_slow_client(self):
+        """Test a chat message that cannot be queued closes the socket."""
+        consumer = self.make_consumer()
+        frames = encode_frames({'content': 'Hello'})
+
+        await consumer.send_frames(frames)
+        await consumer.send_frames(frames)
+        await consumer.send_frames(frames)
+
+        consumer.close.assert_awaited_once_with(code=1013)
+
+
+@override_settings(CHAT_MAX_FRAME_BYTES=64, CHAT_RATE_BURST=2,
+                   CHAT_RATE_PER_SECOND=0.001)
+class ConsumerLimitsTestCase(TransactionTestCase):
+    """Test case for limits enforced by the chat socket."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com', password='testpassword')
+        self.group = Group.objects.create(name='Test Group')
+        self.group.members.add(self.user)
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/"
+        )
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_oversized_frame_closes_connection(self):
+        """Test frames over the size limit close the socket unparsed."""
+        communicator = await self.connect()
+
+        await communicator.send_to(text_data='{"content": "' + 'x' * 64)
+
+        output = await communicator.receive_output(timeout=1)
+        self.assertEqual(output, {'type': 'websocket.close', 'code': 1009})
+
+    async def test_messages_over_rate_are_rejected(self):
+        """Test messages beyond the burst get a rate limit error."""
+        communicator = await self.connect()
+
+        for content in ('one', 'two', 'three'):
+            await communicator.send_json_to({'content': content})
+
+        # The error is sent directly and may overtake the broadcasts
+        frames = [await communicator.receive_json_from(timeout=1)
+                  for _ in range(3)]
+        self.assertCountEqual(
+            [frame.get('content', frame.get('reason')) for frame in frames],
+            ['one', 'two', 'rate_limited'])
+
+        await communicator.disconnect()
+
+    @override_settings(CHAT_MAX_FRAME_BYTES=8192, CHAT_RATE_BURST=10)
+    async def test_malformed_frames_are_rejected(self):
+        """Test undecodable and non-object frames get an error and keep
+        the socket open."""
+        communicator = await self.connect()
+        frames = [
+            {'text_data': '{"content": '},
+            {'text_data': '["content"]'},
+            {'text_data': '"content"'},
+            {'text_data': '[' * 5000},
+            {'bytes_data': b'\xc1'},
+            {'bytes_data': b'\x92\x01'},
+            {'bytes_data': msgpack.packb([1, 2])},
+            {'bytes_data': b'\x91' * 5000},
+        ]
+
+        for frame in frames:
+            await communicator.send_to(**frame)
+            self.assertEqual(await communicator.receive_json_from(timeout=1),
+                             {'type': 'error', 'reason': 'invalid_message'})
+
+        await communicator.disconnect()
@@ -0,0 +1,172 @@
+from unittest.mock import patch
+
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from core import presence
+from core.models import Group
+from groupchat.consumers import GroupChatConsumer
+
+User = get_user_model()
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return User.objects.create_user(**params)
+
+
+class PresenceStoreTestCase(TestCase):
+    """Test case for the presence store."""
+
+    def setUp(self):
+        presence.local_store.clear()
+
+    def test_tracks_connections_per_user(self):
+        """Test a user stays online until the last socket closes."""
+        self.assertEqual(presence.mark_connected(1, 7, 'a'), ({7}, set()))
+        self.assertEqual(presence.mark_connected(1, 7, 'b'),
+                         (set(), set()))
+        self.assertEqual(presence.mark_disconnected(1, 7, 'a'), (set(), set()))
+        self.assertEqual(presence.online_user_ids(1, [7, 8]), {7})
+
+        self.assertEqual(presence.mark_disconnected(1, 7, 'b'), (set(), {7}))
+        self.assertEqual(presence.online_user_ids(1, [7, 8]), set())
+
+    def test_disconnect_is_idempotent(self):
+        """Test closing an unknown socket changes nothing."""
+        presence.mark_connected(1, 7, 'a')
+
+        self.assertEqual(presence.mark_disconnected(1, 7, 'b'), (set(), set()))
+        self.assertEqual(presence.online_user_ids(1, [7]), {7})
+
+    @override_settings(PRESENCE_TTL=60)
+    def test_expired_connections_go_offline(self):
+        """Test connections expire without heartbeats and are reported
+        offline by the next update."""
+        with patch('core.presence.time', return_value=1000):
+            presence.mark_connected(1, 7, 'a')
+            presence.mark_connected(1, 8, 'b')
+        with patch('core.presence.time', return_value=1050):
+            presence.heartbeat(1, 8, 'b')
+
+        with patch('core.presence.time', return_value=1070):
+            self.assertEqual(presence.online_user_ids(1, [7, 8]), {8})
+            self.assertEqual(presence.heartbeat(1, 8, 'b'), (set(), {7}))
+            # A late heartbeat brings the expired connection back
+            self.assertEqual(presence.heartbeat(1, 7, 'a'), ({7}, set()))
+            self.assertEqual(presence.online_user_ids(1, [7, 8]), {7, 8})
+
+
+@override_settings(PRESENCE_DEBOUNCE_SECONDS=0.05)
+class PresenceConsumerTestCase(TestCase):
+    """Test case for presence over the chat socket."""
+
+    def setUp(self):
+        presence.local_store.clear()
+        self.user = create_user(email='user@example.com',
+                                password='testpassword')
+        self.friend = create_user(email='friend@example.com',
+                                  password='testpassword')
+        self.group = Group.objects.create(name='Test Group')
+        self.group.members.add(self.user, self.friend)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/"
+        )
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_presence_deltas_are_debounced(self):
+        """Test joins within a window arrive as a single delta."""
+        first = await self.connect(self.user)
+        second = await self.connect(self.friend)
+
+        delta = await first.receive_json_from(timeout=1)
+        self.assertEqual(delta, {
+            'type': 'presence',
+            'online': sorted([self.user.id, self.friend.id]),
+            'offline': [],
+        })
+        await second.receive_json_from(timeout=1)
+
+        await second.disconnect()
+        delta = await first.receive_json_from(timeout=1)
+        self.assertEqual(delta['offline'], [self.friend.id])
+
+        await first.disconnect()
+
+    @override_settings(PRESENCE_HEARTBEAT_INTERVAL=0)
+    async def test_expired_connection_is_announced_offline(self):
+        """Test a heartbeat reports members whose sockets expired."""
+        communicator = await self.connect(self.user)
+        await communicator.receive_json_from(timeout=1)
+        # A socket of a crashed process, last seen long ago
+        with patch('core.presence.time', return_value=0):
+            presence.mark_connected(self.group.id, self.friend.id, 'gone')
+
+        await communicator.send_json_to({'type': 'heartbeat'})
+
+        delta = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(delta['offline'], [self.friend.id])
+
+        await communicator.disconnect()
+
+    async def test_heartbeat_is_throttled(self):
+        """Test heartbeats within the interval do not touch the cache."""
+        communicator = await self.connect(self.user)
+        await communicator.receive_json_from(timeout=1)
+
+        presence.local_store.clear()
+        await communicator.send_json_to({'type': 'heartbeat'})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+
+        online = presence.online_user_ids(self.group.id, [self.user.id])
+        self.assertEqual(online, set())
+
+        await communicator.disconnect()
+
+
+class GroupPresenceViewTestCase(TestCase):
+    """Test case for GroupPresenceView API."""
+
+    def setUp(self):
+        presence.local_store.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com',
+                                password='testpassword')
+        self.friend = create_user(email='friend@example.com',
+                                  password='testpassword')
+        self.group = Group.objects.create(name='Test Group')
+        self.group.members.add(self.user, self.friend)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('group_presence',
+                           kwargs={'group_id': self.group.id})
+
+    def test_get_online_members(self):
+        """Test retrieving the connected members of a group."""
+        presence.mark_connected(self.group.id, self.friend.id, 'chat.1')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['online'], [self.friend.id])
+
+    def test_get_online_members_not_a_member(self):
+        """Test non-members cannot see presence."""
+        other = create_user(email='other@example.com',
+                            password='testpassword')
+        self.client.force_authenticate(user=other)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,149 @@
+from unittest.mock import patch
+
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import Group, ReadMarker
+from groupchat.consumers import GroupChatConsumer
+from groupchat.receipts import read_markers, save_read_markers
+
+User = get_user_model()
+
+
+def create_user(**params):
+    """Create and return a new user."""
+    return User.objects.create_user(**params)
+
+
+class SaveReadMarkersTestCase(TestCase):
+    """Test case for the read marker upsert."""
+
+    def setUp(self):
+        self.user = create_user(email='user@example.com',
+                                password='testpassword')
+        self.group = Group.objects.create(name='Test Group')
+
+    def test_markers_only_move_forward(self):
+        """Test an older receipt does not overwrite a newer marker."""
+        key = (self.user.id, self.group.id)
+        save_read_markers({key: 10})
+        save_read_markers({key: 4})
+
+        marker = ReadMarker.objects.get(user=self.user, group=self.group)
+        self.assertEqual(marker.last_read_seq, 10)
+
+        with self.assertNumQueries(2):
+            save_read_markers({key: 12})
+        marker.refresh_from_db()
+        self.assertEqual(marker.last_read_seq, 12)
+
+
+@override_settings(PRESENCE_DEBOUNCE_SECONDS=0.01,
+                   READ_MARKER_FLUSH_SECONDS=0.01)
+class EphemeralEventsTestCase(TransactionTestCase):
+    """Test case for typing and read events over the chat socket."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email='user@example.com',
+                                password='testpassword')
+        self.friend = create_user(email='friend@example.com',
+                                  password='testpassword')
+        self.group = Group.objects.create(name='Test Group', message_seq=10)
+        self.group.members.add(self.user, self.friend)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(
+            GroupChatConsumer.as_asgi(),
+            f"/ws/chat/{self.group.id}/"
+        )
+        communicator.scope['url_route'] = {
+            'kwargs': {'group_id': self.group.id}}
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def connect_pair(self):
+        """Connect both members and drain their presence frames."""
+        first = await self.connect(self.user)
+        second = await self.connect(self.friend)
+        for communicator in (first, second):
+            while not await communicator.receive_nothing(timeout=0.1):
+                await communicator.receive_json_from()
+        return first, second
+
+    async def test_typing_is_throttled(self):
+        """Test typing is relayed to others once per throttle window."""
+        first, second = await self.connect_pair()
+
+        await first.send_json_to({'type': 'typing'})
+        await first.send_json_to({'type': 'typing'})
+
+        event = await second.receive_json_from(timeout=1)
+        self.assertEqual(event['type'], 'typing')
+        self.assertEqual(event['user_id'], self.user.id)
+        self.assertTrue(await second.receive_nothing(timeout=0.1))
+        self.assertTrue(await first.receive_nothing(timeout=0.1))
+
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_read_receipts_are_batched(self):
+        """Test read receipts are relayed and persisted in one flush."""
+        first, second = await self.connect_pair()
+
+        await first.send_json_to({'type': 'read', 'seq': 5})
+        await first.send_json_to({'type': 'read', 'seq': 3})
+        await first.send_json_to({'type': 'read', 'seq': 8})
+
+        self.assertEqual(
+            (await second.receive_json_from(timeout=1))['seq'], 5)
+        self.assertEqual(
+            (await second.receive_json_from(timeout=1))['seq'], 8)
+        self.assertTrue(await second.receive_nothing(timeout=0.1))
+
+        await read_markers.flush()
+        marker = await database_sync_to_async(ReadMarker.objects.get)(
+            user=self.user, group=self.group)
+        self.assertEqual(marker.last_read_seq, 8)
+
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_read_receipt_is_clamped_to_latest_message(self):
+        """Test receipts past the last message mark it as read."""
+        first, second = await self.connect_pair()
+
+        await first.send_json_to({'type': 'read', 'seq': 2 ** 70})
+        await first.send_json_to({'type': 'read', 'seq': 12})
+
+        self.assertEqual(
+            (await second.receive_json_from(timeout=1))['seq'], 10)
+        self.assertTrue(await second.receive_nothing(timeout=0.1))
+
+        await read_markers.flush()
+        marker = await database_sync_to_async(ReadMarker.objects.get)(
+            user=self.user, group=self.group)
+        self.assertEqual(marker.last_read_seq, 10)
+
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_failed_flush_is_logged(self):
+        """Test a failing flush is logged and later ones still run."""
+        read_markers.record(self.user.id, self.group.id, 4)
+        with patch('groupchat.receipts.save_read_markers',
+                   side_effect=ValueError('out of range')), \
+                self.assertLogs('groupchat.receipts', 'ERROR'):
+            await read_markers.flush()
+
+        read_markers.record(self.user.id, self.group.id, 6)
+        await read_markers.flush()
+
+        marker = await database_sync_to_async(ReadMarker.objects.get)(
+            user=self.user, group=self.group)
+        self.assertEqual(marker.last_read_seq, 6)
@@ -4,6 +4,11 @@ from . import views
 urlpatterns = [
     path('group-messages/<int:group_id>/',
          views.GroupMessagesView.as_view(), name='group_messages'),
+    path('group-messages/<int:group_id>/archive/',
+         views.GroupMessageArchiveView.as_view(),
+         name='group_message_archive'),
     path('user-chatrooms/',
-         views.GroupListView.as_view(), name='user_chatrooms')
+         views.GroupListView.as_view(), name='user_chatrooms'),
+    path('group-presence/<int:group_id>/',
+         views.GroupPresenceView.as_view(), name='group_presence'),
 ]
@@ -5,7 +5,13 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
-from core.models import Group, Message
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.urls import reverse
+from core import presence
+from core.archive import ArchivedMessages
+from core.db_routing import ReplicaReadMixin
+from core.models import Group, Message, MessageArchive, ReadMarker
 
 User = get_user_model()
 
@@ -25,40 +31,45 @@ class SmallResultsSetPagination(PageNumberPagination):
         })
 
 
-class GroupMessagesView(generics.ListAPIView):
+class GroupMessagesView(ReplicaReadMixin, generics.ListAPIView):
     pagination_class = SmallResultsSetPagination
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        group_id = self.kwargs['group_id']
-        group = Group.objects.filter(id=group_id).first()
+        # Only recent history lives in Message, older months are served
+        # by GroupMessageArchiveView
+        return (Message.objects.filter(group__id=self.kwargs['group_id'])
+                .select_related('sender')
+                .order_by('-seq'))
 
-        if group is None:
-            return Message.objects.none()
-
-        if not group.members.filter(id=self.request.user.id).exists():
-            return Message.objects.none()
-
-        return (Message.objects.filter(group__id=group_id)
-                .order_by('-timestamp'))
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        # Pages may be empty once a group's history is fully archived
+        response.data['archive'] = self.request.build_absolute_uri(
+            reverse('group_message_archive',
+                    kwargs={'group_id': self.kwargs['group_id']}))
+        return response
 
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
-        page = self.paginate_queryset(queryset)
-
-        if not queryset.exists():
+        if not Group.members.through.objects.filter(
+                group_id=self.kwargs['group_id'],
+                user_id=request.user.id).exists():
             return Response({
                 "status": False,
                 "message": "You are not a member of this group."},
                 status=status.HTTP_403_FORBIDDEN)
 
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+
         if page is not None:
             transformed_messages = [
                 {
                     'id': msg.id,
-                    'sender_id': msg.sender.id,
-                    'sender_name': msg.sender.name,
+                    'seq': msg.seq,
+                    'sender_id': msg.sender_id,
+                    'sender_name': msg.sender.name if msg.sender else None,
                     'content': msg.content,
                     'timestamp': msg.timestamp,
                 }
@@ -69,8 +80,9 @@ class GroupMessagesView(generics.ListAPIView):
         transformed_messages = [
             {
                 'id': msg.id,
-                'sender_id': msg.sender.id,
-                'sender_name': msg.sender.name,
+                'seq': msg.seq,
+                'sender_id': msg.sender_id,
+                'sender_name': msg.sender.name if msg.sender else None,
                 'content': msg.content,
                 'timestamp': msg.timestamp,
             }
@@ -93,11 +105,50 @@ class GroupListView(APIView):
 
     def get(self, request):
         """Retrieve all groups for the authenticated user,
-            ensuring they are members."""
+            ensuring they are members, with their unread count and
+            last message."""
         user = request.user
 
-        groups = list(Group.objects.filter(members=user).values(
-            'id', 'name', 'invite_code'))
+        # The latest message is found through the group's sequence
+        # number and unread counts are a difference of two sequence
+        # numbers, so no message history is scanned
+        last_message = Message.objects.filter(
+            group=OuterRef('pk'), seq=OuterRef('message_seq'))
+        last_read = ReadMarker.objects.filter(
+            group=OuterRef('pk'), user=user).values('last_read_seq')
+        rows = (Group.objects.filter(members=user)
+                .annotate(
+                    unread_count=Greatest(
+                        F('message_seq')
+                        - Coalesce(Subquery(last_read), Value(0)),
+                        Value(0)),
+                    last_content=Subquery(
+                        last_message.values('content')),
+                    last_sender_id=Subquery(
+                        last_message.values('sender_id')),
+                    last_sender_name=Subquery(
+                        last_message.values('sender__name')),
+                    last_timestamp=Subquery(
+                        last_message.values('timestamp')))
+                .values('id', 'name', 'invite_code', 'message_seq',
+                        'unread_count', 'last_content', 'last_sender_id',
+                        'last_sender_name', 'last_timestamp'))
+
+        groups = []
+        for row in rows:
+            groups.append({
+                'id': row['id'],
+                'name': row['name'],
+                'invite_code': row['invite_code'],
+                'unread_count': row['unread_count'],
+                'last_message': {
+                    'seq': row['message_seq'],
+                    'sender_id': row['last_sender_id'],
+                    'sender_name': row['last_sender_name'],
+                    'content': row['last_content'],
+                    'timestamp': row['last_timestamp'],
+                } if row['last_content'] is not None else None,
+            })
 
         response_content = {
             'status': True,
@@ -106,3 +157,82 @@ class GroupListView(APIView):
         }
 
         return Response(response_content, status=status.HTTP_200_OK)
+
+
+class GroupPresenceView(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, group_id):
+        """Retrieve the members currently connected to a group chat."""
+        member_ids = set(Group.members.through.objects
+                         .filter(group_id=group_id)
+                         .values_list('user_id', flat=True))
+
+        if request.user.id not in member_ids:
+            return Response({
+                "status": False,
+                "message": "You are not a member of this group."},
+                status=status.HTTP_403_FORBIDDEN)
+
+        return Response({
+            'status': True,
+            'message': 'Group Presence Retrieved',
+            'data': {
+                'online': sorted(
+                    presence.online_user_ids(group_id, member_ids)),
+            }
+        }, status=status.HTTP_200_OK)
+
+
+class GroupMessageArchiveView(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, group_id):
+        """List the archived months of a group, or the messages of one
+        month with `?month=YYYY-MM`."""
+        if not Group.members.through.objects.filter(
+                group_id=group_id, user_id=request.user.id).exists():
+            return Response({
+                "status": False,
+                "message": "You are not a member of this group."},
+                status=status.HTTP_403_FORBIDDEN)
+
+        archives = (MessageArchive.objects
+                    .filter(group_id=group_id)
+                    .order_by('-month', '-first_seq'))
+        month = request.query_params.get('month')
+        if month is None:
+            return Response({
+                'status': True,
+                'message': 'Group Message Archives Retrieved',
+                'data': [{
+                    'month': f'{archive.month:%Y-%m}',
+                    'first_seq': archive.first_seq,
+                    'last_seq': archive.last_seq,
+                    'message_count': archive.message_count,
+                } for archive in archives.reverse()]
+            }, status=status.HTTP_200_OK)
+
+        try:
+            year, month = (int(part) for part in month.split('-'))
+            archives = archives.filter(month__year=year, month__month=month)
+        except ValueError:
+            return Response({
+                "status": False,
+                "message": "Invalid month format. Use YYYY-MM."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        # Pages are read from the archives newest first, like the
+        # recent history, without loading the whole month
+        paginator = SmallResultsSetPagination()
+        messages = paginator.paginate_queryset(
+            ArchivedMessages(archives), request, view=self)
+        sender_ids = {message['sender_id'] for message in messages}
+        senders = dict(User.objects.filter(id__in=sender_ids)
+                       .values_list('id', 'name'))
+        for message in messages:
+            message['sender_name'] = senders.get(message['sender_id'])
+
+        return paginator.get_paginated_response(messages)
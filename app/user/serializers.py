@@ -1,9 +1,6 @@
 """
 Serialzers for the user api view
 """
-import string
-import random
-
 from django.contrib.auth import (
     get_user_model,
     authenticate
@@ -11,15 +8,7 @@ from django.contrib.auth import (
 
 from django.utils.translation import gettext as _
 from rest_framework import serializers
-from core.models import Group
-
-
-def generate_unique_invite_code(length=6):
-    characters = string.ascii_uppercase + string.digits
-    while True:
-        invite_code = ''.join(random.choice(characters) for _ in range(length))
-        if not Group.objects.filter(invite_code=invite_code).exists():
-            return invite_code
+from core.models import AccountDeletion, Group
 
 
 class UserNameSerializer(serializers.ModelSerializer):
@@ -50,6 +39,25 @@ class UserImageSerializer(serializers.ModelSerializer):
         extra_kwargs = {'profile_picture': {'required': True}}
 
 
+class AccountDeletionSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of an account deletion"""
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AccountDeletion
+        fields = ['key', 'status', 'step', 'progress', 'deleted_rows',
+                  'total_rows', 'deleted_files', 'created_at', 'finished_at']
+        read_only_fields = fields
+
+    def get_progress(self, obj):
+        """Percentage of the rows deleted so far."""
+        if obj.status == AccountDeletion.STATUS_DONE:
+            return 100
+        if not obj.total_rows:
+            return 0
+        return min(99, obj.deleted_rows * 100 // obj.total_rows)
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object"""
 
@@ -97,6 +105,32 @@ class GroupSerializer(serializers.ModelSerializer):
         return instance
 
 
+class GroupSummarySerializer(serializers.ModelSerializer):
+    """Serializer for a group without its member list"""
+    member_count = serializers.IntegerField(read_only=True)
+    avatars = serializers.SerializerMethodField()
+
+    # Number of member avatars annotated as avatar_0, avatar_1, ...
+    AVATAR_SAMPLE_SIZE = 3
+
+    class Meta:
+        model = Group
+        fields = ['id', 'name', 'invite_code', 'member_count', 'avatars']
+        read_only_fields = fields
+
+    def get_avatars(self, group):
+        request = self.context.get('request')
+        storage = get_user_model()._meta.get_field('profile_picture').storage
+        avatars = []
+        for i in range(self.AVATAR_SAMPLE_SIZE):
+            name = getattr(group, f'avatar_{i}', None)
+            if name:
+                url = storage.url(name)
+                avatars.append(
+                    request.build_absolute_uri(url) if request else url)
+        return avatars
+
+
 class AuthTokenSerializer(serializers.Serializer):
     """Serializer for the user auth token"""
     email = serializers.EmailField()
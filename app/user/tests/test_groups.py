@@ -1,4 +1,7 @@
-from django.test import TestCase
+import threading
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -30,6 +33,11 @@ def create_group(**params):
     return Group.objects.create(**params)
 
 
+def group_members_url(group_id):
+    """Create and return group members URL"""
+    return reverse('user:group-members', args=[group_id])
+
+
 def group_detail_url(group_id):
     """Create and return group detail URL"""
     return reverse('user:group-detail',
@@ -92,16 +100,24 @@ class PrivateGroupApiTests(TestCase):
                       res.data['detail'])
 
     def test_list_groups(self):
-        """Test listing groups."""
-        create_group(name='Group 1')
-        create_group(name='Group 2')
+        """Test listing groups the user is a member of."""
+        create_group(name='Group 1').members.add(self.user)
+        create_group(name='Group 2').members.add(self.user)
+        create_group(name='Other Group')
         res = self.client.get(GROUPS_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 2)
 
+    def test_retrieve_group_not_member(self):
+        """Test groups of other users are not found."""
+        group = create_group(name='Other Group')
+        res = self.client.get(group_detail_url(group.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_update_group(self):
         """Test updating a group."""
         group = create_group(name='Old Name')
+        group.members.add(self.user)
         payload = {'name': 'Updated Name'}
         url = group_detail_url(group.id)
         res = self.client.patch(url, payload)
@@ -112,6 +128,7 @@ class PrivateGroupApiTests(TestCase):
     def test_delete_group(self):
         """Test deleting a group."""
         group = create_group(name='Group to Delete')
+        group.members.add(self.user)
         url = group_detail_url(group.id)  # Use the group_detail_url function
         res = self.client.delete(url)
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
@@ -138,3 +155,110 @@ class PrivateGroupApiTests(TestCase):
         res = self.client.post(url)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(res.data['detail'], 'User is not a member of a group')
+
+    def test_leave_group_last_member_deletes_group(self):
+        """Test the group is deleted when its last member leaves."""
+        group = create_group(name='Test Group')
+        group.members.add(self.user)
+
+        res = self.client.post(leave_group_url(group.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Group.objects.filter(id=group.id).exists())
+
+    def test_leave_group_keeps_group_with_members(self):
+        """Test the group survives while other members remain."""
+        group = create_group(name='Test Group')
+        other = create_user(email='other@example.com',
+                            password='testpass123')
+        group.members.add(self.user, other)
+
+        res = self.client.post(leave_group_url(group.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(group.members.all()), [other])
+
+    def test_list_groups_summary(self):
+        """Test the summary view counts members in a single query."""
+        group = create_group(name='Group 1')
+        others = [create_user(email=f'user{i}@example.com',
+                              password='testpass123') for i in range(4)]
+        others[0].profile_picture = 'uploads/user/a.jpg'
+        others[0].save()
+        group.members.add(self.user, *others)
+        create_group(name='Group 2').members.add(self.user)
+        create_group(name='Other Group')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(GROUPS_URL, {'view': 'summary'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        groups = {group['name']: group for group in res.data}
+        self.assertEqual(groups['Group 1']['member_count'], 5)
+        self.assertNotIn('members', groups['Group 1'])
+        self.assertEqual(len(groups['Group 1']['avatars']), 1)
+        self.assertTrue(
+            groups['Group 1']['avatars'][0].endswith('uploads/user/a.jpg'))
+        self.assertEqual(groups['Group 2']['member_count'], 1)
+        self.assertNotIn('Other Group', groups)
+
+    def test_list_groups_prefetches_members(self):
+        """Test the full view does not query members per group."""
+        for name in ('Group 1', 'Group 2', 'Group 3'):
+            create_group(name=name).members.add(self.user)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(GROUPS_URL)
+
+        self.assertEqual(res.data[0]['members'][0]['name'], 'Test Name')
+
+    def test_group_members_paginated(self):
+        """Test listing the members of a group page by page."""
+        group = create_group(name='Test Group')
+        group.members.add(self.user, *[
+            create_user(email=f'user{i}@example.com',
+                        password='testpass123') for i in range(2)])
+
+        res = self.client.get(group_members_url(group.id), {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(res.data['results'][0]['id'], self.user.id)
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertIsNone(res.data['next'])
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentMembershipTests(TransactionTestCase):
+    """Test membership changes racing on the same group."""
+
+    def test_last_members_leaving_concurrently(self):
+        """Test two last members leaving at once delete the group."""
+        group = create_group(name='Test Group')
+        users = [create_user(email=f'user{i}@example.com',
+                             password='testpass123') for i in range(2)]
+        group.members.add(*users)
+        barrier = threading.Barrier(len(users))
+        responses = []
+
+        def leave(user):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            barrier.wait()
+            try:
+                responses.append(client.post(leave_group_url(group.id)))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=leave, args=(user,))
+                   for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([res.status_code for res in responses],
+                         [status.HTTP_200_OK] * len(users))
+        self.assertFalse(Group.objects.filter(id=group.id).exists())
@@ -3,18 +3,23 @@ Tests for the user API.
 """
 import os
 import tempfile
+from unittest.mock import patch
 from PIL import Image
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import AccountDeletion, PushOutbox
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+DELETE_ACCOUNT_URL = reverse('user:delete-account')
 
 
 def create_user(**params):
@@ -87,6 +92,22 @@ class PublicUserApiTests(TestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    @patch('core.aws_sns.sns_client')
+    def test_create_token_queues_device_registration(self, patched_sns):
+        """Test login queues device registration without calling SNS."""
+        create_user(email='test@example.com', password='goodpass')
+        payload = {
+            'email': 'test@example.com',
+            'password': 'goodpass',
+            'device_token': 'device-1',
+        }
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(PushOutbox.objects.filter(
+            kind=PushOutbox.KIND_REGISTER, device_token='device-1').exists())
+        self.assertEqual(patched_sns.method_calls, [])
+
     def test_create_token_bad_credentials(self):
         """Test returns error if credentials invalid."""
         create_user(email='test@example.com', password='goodpass')
@@ -142,6 +163,23 @@ class PrivateUserApiTests(TestCase):
             'email': self.user.email,
         })
 
+    def test_delete_account_is_queued(self):
+        """Test deleting the account deactivates it and queues a job."""
+        res = self.client.delete(DELETE_ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        job = AccountDeletion.objects.get(user=self.user)
+        self.assertEqual(res.data['key'], job.key)
+
+        self.client.force_authenticate(user=None)
+        res = self.client.get(res.data['status_url'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], AccountDeletion.STATUS_PENDING)
+        self.assertEqual(res.data['progress'], 0)
+
     def test_post_me_not_allowed(self):
         """Test POST is not allowed for the me endpoint."""
         res = self.client.post(ME_URL, {})
@@ -162,17 +200,32 @@ class PrivateUserApiTests(TestCase):
     def test_get_user_info(self):
         """Test retrieving user information."""
         url = reverse('user:user-info')
-        res = self.client.get(url)
+        res = self.client.get(url, **self.token_header())
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data['email'], self.user.email)
+        self.assertEqual(res.json()['email'], self.user.email)
+
+    def test_get_other_user_info(self):
+        """Test retrieving information about another user."""
+        other = create_user(email='other@example.com', password='pass123',
+                            name='Other')
+        url = reverse('user:user-info') + f'?user_id={other.id}'
+        res = self.client.get(url, **self.token_header())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['name'], 'Other')
 
     def test_get_user_info_invalid_user(self):
         url = reverse('user:user-info') + '?user_id=9999'
-        res = self.client.get(url)
+        res = self.client.get(url, **self.token_header())
 
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
-        self.assertEqual(res.data['error'], 'User not found')
+        self.assertEqual(res.json()['error'], 'User not found')
+
+    def token_header(self):
+        """The info view is async and only accepts token auth."""
+        token = Token.objects.create(user=self.user)
+        return {'HTTP_AUTHORIZATION': f'Token {token.key}'}
 
 
 class UserImageTests(TestCase):
@@ -11,8 +11,7 @@ urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateUserTokenView.as_view(), name='token'),
     path('me/', views.ManageUserView.as_view(), name='me'),
-    path('info/', views.UserViewSet.as_view(
-        {'get': 'get_user_info'}), name='user-info'),
+    path('info/', views.UserInfoView.as_view(), name='user-info'),
     path('info/upload-image/', views.UserViewSet.as_view(
         {'post': 'upload_image'}), name='upload-image'),
     path('info/profile-picture/',
@@ -21,6 +20,9 @@ urlpatterns = [
     path('info/delete-account/',
          views.UserViewSet.as_view({'delete': 'delete_account'}),
          name='delete-account'),
+    path('info/delete-account/<uuid:key>/',
+         views.AccountDeletionStatusView.as_view(),
+         name='delete-account-status'),
     path('', include(router.urls)),
     path('account/delete/', views.user_account_delete_view,
          name='user-account-delete')
@@ -1,7 +1,11 @@
 """
 Views for the user API
 """
-from django.shortcuts import render
+from django.db import transaction
+from django.db.models import Count, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import (
     generics, authentication,
@@ -12,19 +16,60 @@ from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 
 from user.serializers import (
+    AccountDeletionSerializer,
     UserSerializer,
     AuthTokenSerializer,
     GroupSerializer,
+    GroupSummarySerializer,
+    UserNameSerializer,
     UserInfoSerializer,
     UserImageSerializer
 )
 
-from core.models import Group, User
+from core.account_deletion import request_deletion
+from core.async_api import AsyncAPIView, json_response
+from core.models import AccountDeletion, Group, User
 
-from core.aws_sns import create_endpoint, subscribe_user_to_topic
+from core.push import register_device
+
+
+def summarize_groups(queryset):
+    """Annotate groups with their member count and a sample of member
+    avatars, as correlated subqueries of a single query."""
+    member_count = (Group.members.through.objects
+                    .filter(group_id=OuterRef('pk'))
+                    .order_by().values('group_id')
+                    .annotate(total=Count('pk')).values('total'))
+    avatars = (User.objects
+               .filter(group_memberships=OuterRef('pk'))
+               .exclude(profile_picture='')
+               .exclude(profile_picture__isnull=True)
+               .order_by('id').values('profile_picture'))
+    return queryset.annotate(
+        member_count=Coalesce(Subquery(member_count), 0),
+        **{f'avatar_{i}': Subquery(avatars[i:i + 1])
+           for i in range(GroupSummarySerializer.AVATAR_SAMPLE_SIZE)})
+
+
+def user_info_data(user, request):
+    """Basic information about a user with an absolute picture URL."""
+    user_data = UserInfoSerializer(user).data
+    image_url = UserImageSerializer(user).data.get('profile_picture', None)
+    user_data['profile_picture'] = (
+        request.build_absolute_uri(image_url) if image_url else None)
+    return user_data
+
+
+class GroupMembersPagination(CursorPagination):
+    """Keyset pagination over the members of a group."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('id',)
 
 
 class GroupViewSet(viewsets.ModelViewSet):
@@ -33,12 +78,46 @@ class GroupViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     authentication_classes = [TokenAuthentication]
 
+    def is_summary(self):
+        """True if the client asked for `?view=summary`."""
+        return (self.action in ('list', 'retrieve', 'my_groups')
+                and self.request.query_params.get('view') == 'summary')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Joining needs groups the user is not in yet; join and leave
+        # check membership themselves
+        if self.action in ('join_group', 'leave_group'):
+            return queryset
+        queryset = queryset.filter(members=self.request.user)
+        if self.action == 'members':
+            return queryset
+        if self.is_summary():
+            return summarize_groups(queryset)
+        return queryset.prefetch_related(Prefetch(
+            'members', queryset=User.objects.only('id', 'name')))
+
+    def get_serializer_class(self):
+        if self.is_summary():
+            return GroupSummarySerializer
+        return super().get_serializer_class()
+
     @action(methods=['GET'], detail=False)
     def my_groups(self, request):
-        groups = Group.objects.filter(members=request.user)
+        groups = self.get_queryset()
         serializer = self.get_serializer(groups, many=True)
         return Response(serializer.data)
 
+    @action(methods=['GET'], detail=True)
+    def members(self, request, pk=None):
+        """List the members of a group, one page at a time."""
+        group = self.get_object()
+        paginator = GroupMembersPagination()
+        page = paginator.paginate_queryset(
+            group.members.only('id', 'name'), request, view=self)
+        serializer = UserNameSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(methods=['GET'], detail=False, url_path='group-by-invite-code')
     def group_by_invite_code(self, request):
         invite_code = request.query_params.get('invite_code', None)
@@ -55,35 +134,46 @@ class GroupViewSet(viewsets.ModelViewSet):
                 {'error': 'Group not found or invalid invitation code'},
                 status=status.HTTP_404_NOT_FOUND)
 
+    def get_locked_object(self):
+        """Return the group with its row locked until the end of the
+        transaction, serializing membership changes of the group."""
+        queryset = self.get_queryset().select_for_update()
+        group = get_object_or_404(queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, group)
+        return group
+
     @action(methods=['POST'], detail=True, url_path='leave')
     def leave_group(self, request, pk=None):
-        group = self.get_object()
         user = request.user
-        if user in group.members.all():
+        with transaction.atomic():
+            group = self.get_locked_object()
+            if not group.members.filter(pk=user.pk).exists():
+                return Response(
+                    {'detail': 'User is not a member of a group'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             group.members.remove(user)
-            if group.members.count() == 0:
+            # Other leavers wait on the lock, so exactly one of them
+            # sees the group empty
+            if not group.members.exists():
                 group.delete()
-            return Response(
-                {'detail': 'User deleted from the group'},
-                status=status.HTTP_200_OK
-            )
         return Response(
-            {'detail': 'User is not a member of a group'},
-            status=status.HTTP_400_BAD_REQUEST
+            {'detail': 'User deleted from the group'},
+            status=status.HTTP_200_OK
         )
 
     @action(methods=['POST'], detail=True, url_path='join')
     def join_group(self, request, pk=None):
         """Allow a user to join a group."""
-        group = self.get_object()
         user = request.user
-
-        if user in group.members.all():
-            return Response(
-                {'detail': 'User is already a member of this group.'},
-                status=status.HTTP_409_CONFLICT)
-
-        group.members.add(user)
+        with transaction.atomic():
+            group = self.get_locked_object()
+            if group.members.filter(pk=user.pk).exists():
+                return Response(
+                    {'detail': 'User is already a member of this group.'},
+                    status=status.HTTP_409_CONFLICT)
+
+            group.members.add(user)
         return Response({'detail': 'User added to the group.'},
                         status=status.HTTP_200_OK)
 
@@ -111,8 +201,7 @@ class CreateUserTokenView(ObtainAuthToken):
 
         device_token = request.data.get('device_token')
         if device_token:
-            endpoint = create_endpoint(device_token)
-            subscribe_user_to_topic(endpoint)
+            register_device(user, device_token)
 
         return Response({'token': token.key}, status=status.HTTP_200_OK)
 
@@ -150,32 +239,6 @@ class UserViewSet(viewsets.ViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(methods=['GET'], detail=False)
-    def get_user_info(self, request):
-        """Retrieve basic information about a given user
-        or the authenticated user if no ID is provided."""
-        user_id = request.query_params.get('user_id', None)
-        if user_id:
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                return Response({'error': 'User not found'},
-                                status=status.HTTP_404_NOT_FOUND)
-        else:
-            user = request.user
-
-        serializer = UserInfoSerializer(user)
-        image_serializer = UserImageSerializer(user)
-
-        image_url = image_serializer.data.get('profile_picture', None)
-        if image_url:
-            image_url = request.build_absolute_uri(image_url)
-
-        user_data = serializer.data
-        user_data['profile_picture'] = image_url
-
-        return Response(user_data, status=status.HTTP_200_OK)
-
     @action(methods=['GET'], detail=False, url_path='profile-picture')
     def get_profile_picture(self, request):
         """Fetch only the profile picture
@@ -201,15 +264,50 @@ class UserViewSet(viewsets.ViewSet):
 
     @action(methods=['DELETE'], detail=False, url_path='delete-account')
     def delete_account(self, request):
-        """Delete the authenticated user's account."""
-        user = request.user
-        user.delete()
+        """Deactivate the authenticated user's account and queue the
+        deletion of its data."""
+        deletion = request_deletion(request.user)
+        status_url = reverse('user:delete-account-status',
+                             kwargs={'key': deletion.key})
         return Response(
-            {'detail': 'Your account has been deleted.'},
-            status=status.HTTP_200_OK
+            {'detail': 'Your account is being deleted.',
+             'key': deletion.key,
+             'status_url': request.build_absolute_uri(status_url)},
+            status=status.HTTP_202_ACCEPTED
         )
 
 
+class AccountDeletionStatusView(generics.RetrieveAPIView):
+    """Report the progress of an account deletion.
+
+    The account's token is revoked when the deletion starts, so the
+    unguessable job key is what grants access."""
+    serializer_class = AccountDeletionSerializer
+    queryset = AccountDeletion.objects.all()
+    lookup_field = 'key'
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+
+class UserInfoView(AsyncAPIView):
+    """Async view of basic information about a given user."""
+
+    async def get(self, request):
+        """Retrieve basic information about a given user
+        or the authenticated user if no ID is provided."""
+        user_id = request.GET.get('user_id', None)
+        if user_id:
+            try:
+                user = await User.objects.aget(id=user_id)
+            except User.DoesNotExist:
+                return json_response({'error': 'User not found'},
+                                     status=status.HTTP_404_NOT_FOUND)
+        else:
+            user = request.user
+
+        return json_response(user_info_data(user, request))
+
+
 @csrf_exempt
 def user_account_delete_view(request):
     return render(request, "delete-account.html")
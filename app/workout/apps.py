@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WorkoutConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workout'
+
+    def ready(self):
+        from workout import signals  # noqa: F401
@@ -0,0 +1,173 @@
+"""
+Response cache for the workout feed endpoints.
+
+Entries are keyed by viewer and date/window and embed the current
+version token of every scope they depend on. Invalidation replaces a
+scope's token, so stale entries are never read again and simply age out
+of the ``feed`` cache. The tokens must be shared by every server
+process, so with no shared ``feed`` cache configured (a DummyCache)
+feeds are not cached at all.
+"""
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from rest_framework.response import Response
+
+from core import db_routing
+from core.models import Workout
+
+FEED_CACHE_ALIAS = 'feed'
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters for the feed cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def _cache():
+    return caches[FEED_CACHE_ALIAS]
+
+
+def enabled():
+    """Whether a feed cache is configured."""
+    return not isinstance(_cache(), DummyCache)
+
+
+def _version_key(scope):
+    return f'feed:v:{scope}'
+
+
+def _versions(*scopes):
+    """Return the current version token of every scope, creating
+    missing ones."""
+    cache = _cache()
+    keys = {scope: _version_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    versions = []
+    for scope, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def _bump(*scopes):
+    """Replace the version token of the given scopes."""
+    token = uuid.uuid4().hex
+    _cache().set_many(
+        {_version_key(scope): token for scope in scopes}, timeout=None)
+
+
+def _base_uri(request):
+    return request.build_absolute_uri('/')
+
+
+def by_date_key(request, query_date):
+    """Cache key for the `get-by-date` feed of the requesting user, or
+    None when feeds are not cached."""
+    if not enabled():
+        return None
+    viewer_id = request.user.id
+    versions = _versions(f'date:{query_date}', f'member:{viewer_id}')
+    return ':'.join(['feed:date', str(viewer_id), str(query_date),
+                     _base_uri(request), *versions])
+
+
+def last_week_key(request, user_id, start_date, end_date):
+    """Cache key for the `last-week-workouts` feed of a user, or None
+    when feeds are not cached."""
+    if not enabled():
+        return None
+    # The viewer's memberships decide whether the owner is visible
+    versions = _versions(f'owner:{user_id}', f'member:{request.user.id}')
+    return ':'.join(['feed:week', str(request.user.id), str(user_id),
+                     str(start_date), str(end_date),
+                     _base_uri(request), *versions])
+
+
+def get_or_build(key, build):
+    """Return the cached response for `key` or build and store it.
+
+    A stored response may be served for the whole cache timeout, so it
+    is built from the primary: a lagging replica could otherwise pin
+    stale rows under a version that is already current."""
+    if key is None:
+        return build()
+    cache = _cache()
+    entry = cache.get(key)
+    stats.record(entry is not None)
+    if entry is not None:
+        data, status_code = entry
+        return Response(data, status=status_code)
+
+    with db_routing.read_primary():
+        response = build()
+    cache.set(key, (response.data, response.status_code))
+    return response
+
+
+def invalidate_workout(user_id, workout_date):
+    """Invalidate feeds showing a workout of `user_id` on a date."""
+    _bump(f'date:{workout_date}', f'owner:{user_id}')
+
+
+def invalidate_workouts(workouts):
+    """Invalidate feeds showing any of the given (user_id, date)
+    workouts."""
+    scopes = set()
+    for user_id, workout_date in workouts:
+        scopes.update((f'date:{workout_date}', f'owner:{user_id}'))
+    if scopes:
+        _bump(*scopes)
+
+
+def invalidate_owner(user_id):
+    """Invalidate feeds showing any workout of `user_id`, whose name or
+    picture changed."""
+    dates = (Workout.objects.filter(user_id=user_id)
+             .values_list('date', flat=True).distinct())
+    _bump(f'owner:{user_id}', *(f'date:{day}' for day in dates))
+
+
+def invalidate_members(user_ids):
+    """Invalidate feeds of users whose group memberships changed."""
+    if user_ids:
+        _bump(*(f'member:{user_id}' for user_id in user_ids))
+
+
+def clear():
+    """Drop every cached entry and reset the counters."""
+    _cache().clear()
+    stats.reset()
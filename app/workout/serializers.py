@@ -36,10 +36,31 @@ class WorkoutImageSerializer(serializers.ModelSerializer):
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    author = serializers.StringRelatedField(read_only=True)
+    author = serializers.CharField(source='author.name', read_only=True)
     workout = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Comment
         fields = ['id', 'workout', 'author', 'text', 'created_at']
         read_only_fields = ['id', 'author', 'created_at']
+
+
+class WorkoutHydrateSerializer(serializers.Serializer):
+    """Serializer for batch workout hydration parameters"""
+    MAX_IDS = 50
+    MAX_COMMENTS = 10
+
+    workout_ids = serializers.ListField(
+        child=serializers.IntegerField(), max_length=MAX_IDS,
+        required=False, default=list)
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(), max_length=MAX_IDS,
+        required=False, default=list)
+    comments = serializers.IntegerField(
+        min_value=0, max_value=MAX_COMMENTS, required=False, default=3)
+
+    def validate(self, attrs):
+        if not attrs['workout_ids'] and not attrs['user_ids']:
+            raise serializers.ValidationError(
+                'Provide workout_ids or user_ids.')
+        return attrs
@@ -0,0 +1,86 @@
+"""
+Signal handlers keeping the feed cache consistent.
+"""
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    pre_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+
+from core.models import Workout, Comment, Group, User
+from workout import cache as feed_cache
+
+
+def _invalidate_workout_ids(workout_ids):
+    for user_id, workout_date in (Workout.objects
+                                  .filter(id__in=workout_ids)
+                                  .values_list('user_id', 'date')):
+        feed_cache.invalidate_workout(user_id, workout_date)
+
+
+@receiver(post_save, sender=Workout)
+@receiver(post_delete, sender=Workout)
+def invalidate_workout_feeds(sender, instance, **kwargs):
+    """Workout created, updated or deleted."""
+    feed_cache.invalidate_workout(instance.user_id, instance.date)
+
+
+# User fields embedded in feed entries
+FEED_USER_FIELDS = {'name', 'profile_picture'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_owner_feeds(sender, instance, created, update_fields,
+                           **kwargs):
+    """Name or profile picture of a workout owner changed."""
+    if created or (update_fields is not None
+                   and FEED_USER_FIELDS.isdisjoint(update_fields)):
+        return
+    feed_cache.invalidate_owner(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    """Comment count of a workout changed."""
+    _invalidate_workout_ids([instance.workout_id])
+
+
+@receiver(m2m_changed, sender=Workout.liked_by.through)
+def invalidate_like_feeds(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Workout liked or unliked."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        feed_cache.invalidate_workout(instance.user_id, instance.date)
+    elif pk_set:
+        _invalidate_workout_ids(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def invalidate_membership_feeds(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Group membership changed, affecting every member's feed."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        group_ids = (pk_set or set()) if action != 'pre_clear' else \
+            set(instance.group_memberships.values_list('id', flat=True))
+        user_ids = {instance.pk}
+    else:
+        group_ids = {instance.pk}
+        user_ids = set(pk_set or ())
+    user_ids.update(Group.members.through.objects
+                    .filter(group_id__in=group_ids)
+                    .values_list('user_id', flat=True))
+    feed_cache.invalidate_members(user_ids)
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group_feeds(sender, instance, **kwargs):
+    """Group deleted, its members no longer see each other."""
+    feed_cache.invalidate_members(
+        set(instance.members.values_list('id', flat=True)))
@@ -1,11 +1,12 @@
 
 from datetime import date
+from unittest.mock import patch
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from core.models import Workout, Comment
+from core.models import Workout, Comment, NotificationEvent
 from workout.serializers import CommentSerializer
 
 
@@ -54,12 +55,46 @@ class PrivateCommentAPITests(TestCase):
 
     def test_retrieve_comments(self):
         """Test retrieving comments for a specific workout."""
+        Comment.objects.create(workout=self.workout, author=self.user,
+                               text='Nice')
         res = self.client.get(comment_list_url(self.workout.id))
         comments = Comment.objects.filter(workout=self.workout)
         serializer = CommentSerializer(comments, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_retrieve_comments_cursor_pagination(self):
+        """Test comments are paginated newest first with a cursor."""
+        for i in range(5):
+            Comment.objects.create(workout=self.workout, author=self.user,
+                                   text=f'comment {i}')
+
+        res = self.client.get(comment_list_url(self.workout.id),
+                              {'page_size': 3})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([c['text'] for c in res.data['results']],
+                         ['comment 4', 'comment 3', 'comment 2'])
+        self.assertEqual(res.data['results'][0]['author'], self.user.name)
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual([c['text'] for c in res.data['results']],
+                         ['comment 1', 'comment 0'])
+        self.assertIsNone(res.data['next'])
+
+    def test_retrieve_comments_single_query(self):
+        """Test comment authors are loaded in the same query."""
+        for i in range(3):
+            author = get_user_model().objects.create_user(
+                f'author{i}@example.com', 'password123', name=f'Author {i}')
+            Comment.objects.create(workout=self.workout, author=author,
+                                   text='Nice')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(comment_list_url(self.workout.id))
+
+        self.assertEqual({c['author'] for c in res.data['results']},
+                         {'Author 0', 'Author 1', 'Author 2'})
 
     def test_create_comment(self):
         """Test creating a comment on a workout."""
@@ -75,6 +110,16 @@ class PrivateCommentAPITests(TestCase):
             author=self.user,
             text=text
         ).exists())
+        self.assertTrue(NotificationEvent.objects.filter(
+            workout=self.workout, actor=self.user).exists())
+
+    def test_create_comment_missing_workout(self):
+        """Test commenting on a missing workout returns 404."""
+        res = self.client.post(comment_list_url(self.workout.id + 1),
+                               {'text': 'hello?'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Comment.objects.exists())
 
     def test_delete_comment(self):
         """Test deleting a comment."""
@@ -102,3 +147,28 @@ class PrivateCommentAPITests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
         self.assertTrue(Comment.objects.filter(id=comment.id).exists())
+
+    def test_comment_counter_updates(self):
+        """Test creating and deleting comments maintains the counter."""
+        url = comment_list_url(self.workout.id)
+        self.client.post(url, {'text': 'first'}, format='json')
+        self.client.post(url, {'text': 'second'}, format='json')
+        self.workout.refresh_from_db()
+        self.assertEqual(self.workout.comments_count, 2)
+
+        comment = Comment.objects.filter(workout=self.workout).first()
+        self.client.delete(comment_detail_url(self.workout.id, comment.id))
+        self.workout.refresh_from_db()
+        self.assertEqual(self.workout.comments_count, 1)
+
+    @patch('core.models.process_image')
+    def test_comment_counter_skips_image_pipeline(self, patched_process):
+        """Test counter updates never re-process the workout image."""
+        Workout.objects.filter(pk=self.workout.pk).update(
+            image='uploads/workout/existing.jpg')
+
+        comment = Comment.objects.create(
+            workout=self.workout, author=self.user, text='Nice')
+        comment.delete()
+
+        patched_process.assert_not_called()
@@ -0,0 +1,206 @@
+from datetime import date
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Workout, Group, Comment
+from workout import cache as feed_cache
+
+WORKOUT_BY_DATE = reverse('workout:workout-get-by-date')
+LAST_WEEK_URL = reverse('workout:workout-get-last-week-workouts')
+
+
+def toggle_like_url(workout_id):
+    """Create and return a workout like URL"""
+    return reverse('workout:workout-toggle-like', args=[workout_id])
+
+
+def create_user(email, **params):
+    return get_user_model().objects.create_user(email, 'testpass123',
+                                                **params)
+
+
+FEED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'feed-test',
+    },
+}
+
+
+@override_settings(CACHES=FEED_CACHES)
+class FeedCacheTests(TestCase):
+    """Tests for the feed response cache."""
+
+    def setUp(self):
+        feed_cache.clear()
+        self.client = APIClient()
+        self.user = create_user('user@example.com')
+        self.friend = create_user('friend@example.com')
+        self.group = Group.objects.create(name='Gym')
+        self.group.members.add(self.user, self.friend)
+        self.client.force_authenticate(self.user)
+        self.date = date(2023, 9, 22)
+        self.params = {'date': str(self.date)}
+
+    def test_repeated_request_is_served_from_cache(self):
+        """Test a second identical request hits the cache."""
+        Workout.objects.create(user=self.friend, date=self.date)
+
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+        with self.assertNumQueries(0):
+            cached = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.data, res.data)
+        self.assertEqual(feed_cache.stats.snapshot()['hits'], 1)
+        self.assertEqual(feed_cache.stats.snapshot()['misses'], 1)
+
+    def test_cache_keyed_by_viewer(self):
+        """Test viewers do not share cached feeds."""
+        workout = Workout.objects.create(user=self.friend, date=self.date)
+        workout.liked_by.add(self.user)
+
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+        self.client.force_authenticate(self.friend)
+        other = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertTrue(res.data[0]['isLiked'])
+        self.assertFalse(other.data[0]['isLiked'])
+        self.assertEqual(feed_cache.stats.snapshot()['hits'], 0)
+
+    def test_workout_create_and_delete_invalidate(self):
+        """Test creating and deleting workouts refreshes the feed."""
+        self.client.get(WORKOUT_BY_DATE, self.params)
+        workout = Workout.objects.create(user=self.friend, date=self.date)
+
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        workout.delete()
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_like_toggle_invalidates(self):
+        """Test liking a workout refreshes cached fires."""
+        workout = Workout.objects.create(user=self.friend, date=self.date)
+        self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.client.post(toggle_like_url(workout.id))
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(res.data[0]['fires'], 1)
+        self.assertTrue(res.data[0]['isLiked'])
+
+    def test_comment_invalidates(self):
+        """Test commenting refreshes the cached comment count."""
+        workout = Workout.objects.create(user=self.friend, date=self.date)
+        self.client.get(WORKOUT_BY_DATE, self.params)
+
+        Comment.objects.create(workout=workout, author=self.user, text='Hi')
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(res.data[0]['comments_count'], 1)
+
+    def test_owner_profile_change_invalidates(self):
+        """Test renaming a workout owner refreshes feeds showing them."""
+        Workout.objects.create(user=self.friend, date=self.date)
+        self.client.get(WORKOUT_BY_DATE, self.params)
+        self.client.get(LAST_WEEK_URL, {'user_id': self.friend.id})
+
+        self.friend.name = 'Renamed'
+        self.friend.save()
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(res.data[0]['username'], 'Renamed')
+
+    def test_unrelated_user_update_keeps_cache(self):
+        """Test saving fields the feed does not show keeps entries."""
+        Workout.objects.create(user=self.friend, date=self.date)
+        self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.friend.save(update_fields=['last_login'])
+        self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(feed_cache.stats.snapshot()['hits'], 1)
+
+    def test_counter_repair_invalidates(self):
+        """Test reconciled counters are not hidden by cached feeds."""
+        workout = Workout.objects.create(user=self.friend, date=self.date)
+        Workout.objects.filter(pk=workout.pk).update(fires=5)
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+        self.assertEqual(res.data[0]['fires'], 5)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(res.data[0]['fires'], 0)
+
+    def test_membership_change_invalidates(self):
+        """Test leaving a group removes group mates from the feed."""
+        Workout.objects.create(user=self.friend, date=self.date)
+        Workout.objects.create(user=self.user, date=self.date)
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+        self.assertEqual(len(res.data), 2)
+
+        self.group.members.remove(self.friend)
+        res = self.client.get(WORKOUT_BY_DATE, self.params)
+
+        self.assertEqual(len(res.data), 1)
+
+    def test_last_week_invalidated_by_owner_workouts(self):
+        """Test the week view refreshes when the owner adds a workout."""
+        res = self.client.get(LAST_WEEK_URL, {'user_id': self.friend.id})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        Workout.objects.create(user=self.friend, date=date.today())
+        res = self.client.get(LAST_WEEK_URL, {'user_id': self.friend.id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    @override_settings(CACHES={
+        'default': FEED_CACHES['default'],
+        'feed': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'feed-bounded',
+            'OPTIONS': {'MAX_ENTRIES': 10},
+        },
+    })
+    def test_cache_is_bounded(self):
+        """Test the cache evicts entries beyond its configured size."""
+        for day in range(1, 29):
+            self.client.get(WORKOUT_BY_DATE, {'date': f'2023-02-{day:02d}'})
+
+        self.assertLessEqual(len(feed_cache._cache()._cache), 10)
+
+
+class FeedCacheDisabledTests(TestCase):
+    """Tests for feeds without a shared feed cache configured."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('user@example.com')
+        self.client.force_authenticate(self.user)
+        self.date = date(2023, 9, 22)
+        feed_cache.stats.reset()
+
+    def test_feed_is_not_cached(self):
+        """Test every request builds the feed when caching is off."""
+        self.assertFalse(feed_cache.enabled())
+        self.client.get(WORKOUT_BY_DATE, {'date': str(self.date)})
+        Workout.objects.create(user=self.user, date=self.date)
+
+        res = self.client.get(WORKOUT_BY_DATE, {'date': str(self.date)})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(feed_cache.stats.snapshot()['hits'], 0)
@@ -1,18 +1,21 @@
 import os
 import tempfile
+from unittest.mock import patch
 from PIL import Image
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
-from core.models import Workout, Group
+from core.models import Workout, Group, Comment
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 from workout.serializers import WorkoutSerializer
+from workout.views import WorkoutViewSet
 from datetime import date, timedelta
 
 WORKOUT_URL = reverse('workout:workout-list')
 WORKOUT_BY_DATE = reverse('workout:workout-get-by-date')
+HYDRATE_URL = reverse('workout:workout-hydrate')
 
 
 def workout_detail(workout_id):
@@ -160,6 +163,7 @@ class PrivateWorkoutAPITests(TestCase):
             'other@example.com',
             'password123'
         )
+        Group.objects.create(name='Gym').members.add(self.user, other_user)
         today = timezone.now().date()
         create_workout(user=other_user, given_date=today - timedelta(days=3))
         create_workout(user=self.user, given_date=today - timedelta(days=1))
@@ -182,6 +186,49 @@ class PrivateWorkoutAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_last_week_workouts_not_group_mate(self):
+        """Test workouts of users outside the viewer's groups are hidden."""
+        stranger = get_user_model().objects.create_user(
+            'stranger@example.com',
+            'password123'
+        )
+        create_workout(user=stranger)
+
+        res = self.client.get(
+            last_week_workouts_url(), {'user_id': stranger.id})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_workouts_scoped_to_group_mates(self):
+        """Test listing returns own and group mates' workouts only."""
+        mate = get_user_model().objects.create_user(
+            'mate@example.com', 'password123')
+        stranger = get_user_model().objects.create_user(
+            'stranger@example.com', 'password123')
+        Group.objects.create(name='Gym').members.add(self.user, mate)
+        Group.objects.create(name='Club').members.add(self.user, mate)
+        own = create_workout(user=self.user)
+        mates = create_workout(user=mate)
+        create_workout(user=stranger)
+
+        res = self.client.get(WORKOUT_URL)
+
+        self.assertEqual([workout['id'] for workout in res.data],
+                         [mates.id, own.id])
+
+    def test_update_group_mates_workout_not_allowed(self):
+        """Test only the owner can modify a workout."""
+        mate = get_user_model().objects.create_user(
+            'mate@example.com', 'password123')
+        Group.objects.create(name='Gym').members.add(self.user, mate)
+        workout = create_workout(user=mate)
+
+        res = self.client.patch(workout_detail(workout.id), {'title': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(workout_detail(workout.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_last_week_workouts_user_not_found(self):
         """Test error response when specified user does not exist."""
         res = self.client.get(last_week_workouts_url(), {'user_id': -1})
@@ -253,3 +300,123 @@ class ImageUploadTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(workout.fires, 0)
         self.assertEqual(res.data['fires'], 0)
+
+    def test_toggle_like_keeps_concurrent_comment_count(self):
+        """Test a like does not write back a stale comments_count."""
+        workout = create_workout(user=self.user)
+        get_object = WorkoutViewSet.get_object
+
+        def get_object_then_comment(view):
+            loaded = get_object(view)
+            # Another request comments after the like loaded the row
+            Comment.objects.create(workout=workout, author=self.user,
+                                   text='Nice')
+            return loaded
+
+        with patch.object(WorkoutViewSet, 'get_object',
+                          get_object_then_comment):
+            res = self.client.post(toggle_like_url(workout.id))
+
+        workout.refresh_from_db()
+        self.assertEqual(res.data['fires'], 1)
+        self.assertEqual(workout.fires, 1)
+        self.assertEqual(workout.comments_count, 1)
+
+
+class HydrateWorkoutsTests(TestCase):
+    """Tests for the batch workout hydrate API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.other_user = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        Group.objects.create(name='Gym').members.add(
+            self.user, self.other_user)
+        self.client.force_authenticate(self.user)
+
+    def test_hydrate_by_workout_ids(self):
+        """Test hydrating workouts returns likes and top comments."""
+        liked = create_workout(user=self.other_user)
+        liked.liked_by.add(self.user)
+        other = create_workout(user=self.other_user)
+        for i in range(4):
+            Comment.objects.create(workout=liked, author=self.other_user,
+                                   text=f'comment {i}')
+
+        res = self.client.post(HYDRATE_URL, {
+            'workout_ids': [liked.id, other.id],
+            'comments': 2}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        data = {workout['id']: workout for workout in res.data}
+        self.assertTrue(data[liked.id]['isLiked'])
+        self.assertFalse(data[other.id]['isLiked'])
+        self.assertEqual(
+            [c['text'] for c in data[liked.id]['top_comments']],
+            ['comment 3', 'comment 2'])
+        self.assertEqual(data[other.id]['top_comments'], [])
+
+    def test_hydrate_by_user_ids_returns_last_week(self):
+        """Test hydrating users returns their last week workouts."""
+        today = timezone.now().date()
+        recent = create_workout(user=self.other_user,
+                                given_date=today - timedelta(days=2))
+        create_workout(user=self.other_user,
+                       given_date=today - timedelta(days=10))
+
+        res = self.client.post(HYDRATE_URL, {
+            'user_ids': [self.other_user.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([w['id'] for w in res.data], [recent.id])
+
+    def test_hydrate_query_count_is_constant(self):
+        """Test hydration uses set-based queries regardless of size."""
+        workouts = [create_workout(user=self.other_user) for _ in range(5)]
+        for workout in workouts:
+            workout.liked_by.add(self.user)
+            Comment.objects.create(workout=workout, author=self.user,
+                                   text='Nice')
+
+        with self.assertNumQueries(3):
+            res = self.client.post(HYDRATE_URL, {
+                'workout_ids': [w.id for w in workouts]}, format='json')
+
+        self.assertEqual(len(res.data), 5)
+
+    def test_hydrate_only_returns_visible_workouts(self):
+        """Test hydrating skips workouts of users outside the groups."""
+        stranger = get_user_model().objects.create_user(
+            'stranger@example.com',
+            'password123',
+        )
+        hidden = create_workout(user=stranger)
+        Comment.objects.create(workout=hidden, author=stranger,
+                               text='private')
+        visible = create_workout(user=self.other_user)
+
+        res = self.client.post(HYDRATE_URL, {
+            'workout_ids': [hidden.id, visible.id],
+            'user_ids': [stranger.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([w['id'] for w in res.data], [visible.id])
+
+    def test_hydrate_limits_ids(self):
+        """Test requesting too many workouts is rejected."""
+        res = self.client.post(HYDRATE_URL, {
+            'workout_ids': list(range(1, 100))}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_hydrate_requires_ids(self):
+        """Test hydrating without ids is rejected."""
+        res = self.client.post(HYDRATE_URL, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
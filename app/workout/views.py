@@ -7,32 +7,60 @@ Views for the workout APIs
 from datetime import datetime, timedelta
 
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Prefetch, Q, Window
+from django.db.models.functions import RowNumber
 from rest_framework import viewsets, status, generics
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Workout, Comment
+from core.db_routing import ReplicaReadMixin
+from core.models import Workout, Comment, Group
+from core.notifications import notify_comment
 from rest_framework.response import Response
 from workout import serializers
+from workout import cache as feed_cache
 from user.serializers import UserImageSerializer
 
 
-class WorkoutViewSet(viewsets.ModelViewSet):
+def group_mate_ids(user):
+    """Subquery of the ids of users sharing a group with `user`."""
+    memberships = Group.members.through.objects
+    return (memberships
+            .filter(group_id__in=memberships.filter(user_id=user.id)
+                    .values('group_id'))
+            .values('user_id'))
+
+
+class WorkoutViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.WorkoutSerializer
     queryset = Workout.objects.all()
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
+    # Feed reads tolerate replication lag
+    replica_actions = ('get_by_date', 'get_last_week_workouts', 'hydrate')
+    # Actions that modify a workout are limited to its owner
+    owner_actions = ('update', 'partial_update', 'destroy', 'upload_image')
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
     def get_queryset(self):
-        """Retrieve workouts for authenticated user."""
-        queryset = self.queryset
-        return queryset.filter().order_by('-id').distinct()
+        """Retrieve workouts visible to the authenticated user: their own
+        and those of their group mates."""
+        user = self.request.user
+        if self.action in self.owner_actions:
+            queryset = self.queryset.filter(user=user)
+        else:
+            # IN over the membership table, no join to deduplicate
+            queryset = self.queryset.filter(
+                Q(user=user) | Q(user_id__in=group_mate_ids(user)))
+        return queryset.order_by('-id')
 
     def get_serializer_class(self):
         """Return the serializer class for request"""
@@ -63,14 +91,20 @@ class WorkoutViewSet(viewsets.ModelViewSet):
     def toggle_like(self, request, pk=None):
         """Hande liking a workout"""
         workout = self.get_object()
-        if request.user not in workout.liked_by.all():
-            workout.fires += 1
-            workout.liked_by.add(request.user)
-        else:
-            workout.liked_by.remove(request.user)
-            workout.fires -= 1
-        workout.save()
-        return Response({'fires': workout.fires}, status=status.HTTP_200_OK)
+        workouts = Workout.objects.filter(pk=workout.pk)
+        with transaction.atomic():
+            # Serializes toggles of one workout; the counter itself is
+            # a column-only update like comments_count, so concurrent
+            # comments are never overwritten
+            list(workouts.select_for_update().values_list('pk'))
+            if workout.liked_by.filter(pk=request.user.pk).exists():
+                workout.liked_by.remove(request.user)
+                workouts.filter(fires__gt=0).update(fires=F('fires') - 1)
+            else:
+                workout.liked_by.add(request.user)
+                workouts.update(fires=F('fires') + 1)
+            fires = workouts.values_list('fires', flat=True).get()
+        return Response({'fires': fires}, status=status.HTTP_200_OK)
 
     @action(methods=['GET'], detail=False, url_path='get-by-date')
     def get_by_date(self, request, pk=None):
@@ -86,22 +120,14 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         else:
             query_date = datetime.today().date()
 
-        # Get the user model
-        User = get_user_model()
-        user_groups = request.user.group_memberships.all()
-        group_member_ids = (User.objects
-                            .filter(group_memberships__in=user_groups)
-                            .values_list('id',
-                                         flat=True).distinct())
-
-        # Retrieve workouts for users in the same groups on the specified date
-        workouts = (self.get_queryset()
-                    .filter(user__in=group_member_ids, date=query_date))
+        return feed_cache.get_or_build(
+            feed_cache.by_date_key(request, query_date),
+            lambda: self._build_by_date(request, query_date))
 
-        # If no workouts found, retrieve just user workouts
-        if not workouts.exists():
-            workouts = (self.get_queryset()
-                        .filter(date=query_date, user=request.user))
+    def _build_by_date(self, request, query_date):
+        """Build the `get-by-date` response for the requesting user."""
+        # Workouts of the user and their group mates on the specified date
+        workouts = self.get_queryset().filter(date=query_date)
 
         if workouts.exists():
             return Response(self._prepare_workout_data(workouts, request),
@@ -126,6 +152,12 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         else:
             user = request.user
 
+        return feed_cache.get_or_build(
+            feed_cache.last_week_key(request, user.id, start_date, today),
+            lambda: self._build_last_week(request, user, start_date, today))
+
+    def _build_last_week(self, request, user, start_date, today):
+        """Build the `last-week-workouts` response for a user."""
         workouts = self.get_queryset().filter(
             user=user,
             date__range=[start_date, today]).order_by('-date')
@@ -138,8 +170,61 @@ class WorkoutViewSet(viewsets.ModelViewSet):
                         'No workouts found for the user in the last week.'},
                         status=status.HTTP_404_NOT_FOUND)
 
+    @action(methods=['POST'], detail=False, url_path='hydrate')
+    def hydrate(self, request):
+        """Return many workouts with like status, image URLs
+        and their latest comments in one response. Only workouts
+        visible to the requesting user are returned."""
+        params = serializers.WorkoutHydrateSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        workout_ids = params.validated_data['workout_ids']
+        user_ids = params.validated_data['user_ids']
+
+        filters = Q(id__in=workout_ids)
+        if user_ids:
+            today = datetime.today().date()
+            filters |= Q(user_id__in=user_ids,
+                         date__range=[today - timedelta(days=7), today])
+
+        workouts = self.get_queryset().filter(filters).order_by('-date', '-id')
+        workout_data = self._prepare_workout_data(workouts, request)
+        top_comments = self._top_comments(
+            [data['id'] for data in workout_data],
+            params.validated_data['comments'])
+
+        for data in workout_data:
+            data['top_comments'] = top_comments.get(data['id'], [])
+
+        return Response(workout_data, status=status.HTTP_200_OK)
+
+    def _top_comments(self, workout_ids, limit):
+        """Return the latest `limit` comments of every workout,
+        keyed by workout id."""
+        comments = {}
+        if not workout_ids or not limit:
+            return comments
+
+        ranked = (Comment.objects
+                  .filter(workout_id__in=workout_ids)
+                  .select_related('author')
+                  .annotate(rank=Window(
+                      RowNumber(),
+                      partition_by=F('workout_id'),
+                      order_by=[F('created_at').desc(), F('id').desc()]))
+                  .filter(rank__lte=limit)
+                  .order_by('workout_id', 'rank'))
+
+        for comment, comment_data in zip(
+                ranked, serializers.CommentSerializer(ranked, many=True).data):
+            comments.setdefault(comment.workout_id, []).append(comment_data)
+
+        return comments
+
     def _prepare_workout_data(self, workouts, request):
         """Helper method to prepare combined workout data."""
+        workouts = workouts.select_related('user').prefetch_related(
+            Prefetch('liked_by',
+                     queryset=get_user_model().objects.only('id')))
         workout_serializer = self.get_serializer(workouts, many=True)
         combined_data = []
 
@@ -166,22 +251,35 @@ class WorkoutViewSet(viewsets.ModelViewSet):
         return combined_data
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentCursorPagination(CursorPagination):
+    """Keyset pagination over a workout's comments, newest first."""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class CommentListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     serializer_class = serializers.CommentSerializer
+    pagination_class = CommentCursorPagination
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def get_workout(self):
-        workout_id = self.kwargs.get('workout_id')
-        return Workout.objects.get(id=workout_id)
-
     def get_queryset(self):
-        workout = self.get_workout()
-        return Comment.objects.filter(workout=workout).order_by('-created_at')
+        return (Comment.objects
+                .filter(workout_id=self.kwargs.get('workout_id'))
+                .select_related('author')
+                .only('id', 'workout_id', 'text', 'created_at',
+                      'author__name'))
 
     def perform_create(self, serializer):
-        workout = self.get_workout()
-        serializer.save(author=self.request.user, workout=workout)
+        try:
+            comment = serializer.save(
+                author=self.request.user,
+                workout_id=self.kwargs.get('workout_id'))
+        except Workout.DoesNotExist:
+            raise NotFound('Workout not found.')
+        notify_comment(comment.workout_id, comment.author_id, comment.text)
 
 
 class CommentDetailView(generics.RetrieveDestroyAPIView):
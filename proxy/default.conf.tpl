@@ -1,9 +1,17 @@
-
 map $http_upgrade $connection_upgrade {
   default upgrade;
     '' close;
 }
 
+upstream app {
+    server ${APP_HOST}:${APP_PORT};
+    keepalive 32;
+}
+
+upstream ws {
+    server ${WS_HOST}:${WS_PORT};
+}
+
 
 server {
     listen ${LISTEN_PORT};
@@ -12,12 +20,21 @@ server {
         alias /vol/static;
     }
 
-    location / {
-        proxy_pass  http://${APP_HOST}:${APP_PORT};
+    location /ws/ {
+        proxy_pass  http://ws;
         proxy_http_version 1.1;
         proxy_set_header Upgrade $http_upgrade;
         proxy_set_header Connection $connection_upgrade;
         proxy_set_header Host $host;
+        proxy_read_timeout 1h;
+    }
+
+    location / {
+        proxy_pass  http://app;
+        proxy_http_version 1.1;
+        # Reuse upstream connections
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
         client_max_body_size    10M;
     }
 }
\ No newline at end of file
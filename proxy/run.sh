@@ -1,6 +1,6 @@
 #!/bin/sh
 
 set -e
-envsubst '$${LISTEN_PORT},$${APP_PORT},$${APP_HOST}' < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+envsubst '$${LISTEN_PORT},$${APP_PORT},$${APP_HOST},$${WS_HOST},$${WS_PORT}' < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
 
 nginx -g 'daemon off;'
\ No newline at end of file
@@ -2,8 +2,45 @@
 
 set -e
 
+# single: one daphne process serving HTTP and WebSockets
+# http:   gunicorn managing uvicorn workers for the HTTP API
+# ws:     gunicorn managing uvicorn workers for the /ws/ sockets
+# http and ws need REDIS_URL so processes share caches and chat groups.
+# Both drain on SIGTERM and replace their workers gracefully on SIGHUP.
+SERVER_MODE=${SERVER_MODE:-single}
+
 python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
 
-daphne -b 0.0.0.0 -p 9000 app.asgi:application
\ No newline at end of file
+if [ "$SERVER_MODE" != "ws" ]; then
+    python manage.py collectstatic --noinput
+    python manage.py migrate
+fi
+
+case "$SERVER_MODE" in
+    single)
+        exec daphne -b 0.0.0.0 -p 9000 app.asgi:application
+        ;;
+    http)
+        exec gunicorn app.asgi:application \
+            --worker-class uvicorn_worker.UvicornWorker \
+            --bind 0.0.0.0:9000 \
+            --workers "${HTTP_WORKERS:-4}" \
+            --graceful-timeout "${HTTP_GRACEFUL_TIMEOUT:-30}" \
+            --keep-alive 75 \
+            --max-requests "${HTTP_MAX_REQUESTS:-5000}" \
+            --max-requests-jitter 500
+        ;;
+    ws)
+        # Stopping workers close their sockets with 1012 (service
+        # restart) so clients reconnect to a live worker
+        exec gunicorn app.asgi:application \
+            --worker-class uvicorn_worker.UvicornWorker \
+            --bind 0.0.0.0:9001 \
+            --workers "${WS_WORKERS:-2}" \
+            --graceful-timeout "${WS_GRACEFUL_TIMEOUT:-60}"
+        ;;
+    *)
+        echo "Unknown SERVER_MODE: $SERVER_MODE" >&2
+        exit 1
+        ;;
+esac